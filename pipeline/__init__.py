@@ -1 +1 @@
-from . import parallel, service, system
\ No newline at end of file
+from . import parallel, pipe, service, system
\ No newline at end of file
@@ -0,0 +1,41 @@
+from .parallel import SimpleThread
+
+import math
+import threading
+
+
+class Autoscaler(SimpleThread):
+	def __init__(self, system, interval=1, drain_time=1):
+		super(Autoscaler, self).__init__()
+		self.system = system
+		self.interval = interval
+		self.drain_time = drain_time
+		self.last_idle = {}
+		self.stopped = threading.Event()
+
+	def abort(self):
+		super(Autoscaler, self).abort()
+		self.stopped.set()
+
+	def exec(self):
+		while not self.stopped.wait(self.interval):
+			for group in self.system.worker_groups:
+				if group.autoscaled() and group.is_alive():
+					self.scale(group)
+
+	def scale(self, group):
+		workers = [worker for worker in group.worker_list if worker.is_alive() and not worker.retired]
+		if not workers:
+			return
+		backlog = group.backlog()
+		idle = sum(worker.metrics.total_idle() for worker in workers)
+		idle_delta = idle - self.last_idle.get(group, idle)
+		self.last_idle[group] = idle
+
+		latency = group.stats()['latency']['p50'] or 0
+		if backlog > len(workers) and backlog * latency / len(workers) > self.drain_time:
+			for _ in range(math.ceil(backlog * latency / self.drain_time) - len(workers)):
+				if group.scale_up() is None:
+					break
+		elif backlog == 0 and idle_delta >= self.interval:
+			group.scale_down()
@@ -0,0 +1,212 @@
+from .parallel import SimpleWorker, SIGNAL_STOP
+from .pipe import Pipe
+from .service import ServiceWorker, ServiceManager
+from .system import System
+from .metrics import percentiles
+
+import argparse
+import json
+import sys
+import time
+import traceback
+from collections import deque
+
+
+class PollingWorker(SimpleWorker):
+	def __init__(self, pipe, config):
+		super(PollingWorker, self).__init__(pipe, config)
+		self.idle_fallback = 1
+
+	def exec(self):
+		while self.running:
+			try:
+				if len(self.input) == 0:
+					time.sleep(self.idle_fallback)
+					self.idle_fallback = min(self.idle_fallback + 1, 10)
+				else:
+					data = self.input.popleft()
+					if data is SIGNAL_STOP:
+						self.abort()
+					else:
+						self.process(data)
+						self.idle_fallback = 1
+			except:
+				traceback.print_exc()
+
+class LatencyProbe:
+	def process(self, sent_at):
+		self.config.append(time.perf_counter() - sent_at)
+
+class PollingProbe(LatencyProbe, PollingWorker):
+	pass
+
+class PipeProbe(LatencyProbe, SimpleWorker):
+	pass
+
+def measure_latency(worker_type, pipe, items, gap):
+	latencies = []
+	worker = worker_type(pipe, latencies)
+	worker.start()
+	for _ in range(items):
+		time.sleep(gap)
+		pipe.append(time.perf_counter())
+	pipe.append(SIGNAL_STOP)
+	worker.join()
+	return latencies
+
+def report(name, latencies):
+	latencies = sorted(latencies)
+	print('%-8s items=%d min=%.6fs median=%.6fs max=%.6fs' % (
+		name,
+		len(latencies),
+		latencies[0],
+		latencies[len(latencies) // 2],
+		latencies[-1],
+	))
+
+class EchoService(ServiceWorker):
+	def process(self, data):
+		return data
+
+	class Port(ServiceWorker.Port):
+		def echo(self, data):
+			return self.request(data, no_wait=False)
+
+class BenchSource(SimpleWorker):
+	def process(self, dummy):
+		payload = bytes(self.config['size'])
+		for index in range(self.config['items']):
+			self.output({'index': index, 'payload': payload, 'sent_at': time.perf_counter()})
+
+class BenchStage(SimpleWorker):
+	def process(self, item):
+		if self.config['cpu']:
+			until = time.perf_counter() + self.config['cpu']
+			while time.perf_counter() < until:
+				pass
+		if self.config['sleep']:
+			time.sleep(self.config['sleep'])
+		if self.config['service']:
+			item = ServiceManager.get('benchmark-echo').echo(item)
+		self.output(item)
+
+class BenchSink(SimpleWorker):
+	def process(self, item):
+		self.config['latencies'].append(time.perf_counter() - item['sent_at'])
+
+SCENARIOS = {
+	'overhead': dict(stages=1, workers=1),
+	'chain': dict(stages=4, workers=1),
+	'fused': dict(stages=4, workers=1, fuse=True),
+	'pooled': dict(stages=4, workers=2, pool=True),
+	'fanout': dict(stages=2, workers=4),
+	'bounded': dict(stages=2, workers=2, capacity=64),
+	'cpu': dict(stages=2, workers=2, cpu=0.0002),
+	'sleep': dict(stages=2, workers=8, sleep=0.001),
+	'service': dict(stages=2, workers=2, service=True),
+}
+
+def run_pipeline(items=2000, stages=1, workers=1, size=64, cpu=0, sleep=0, service=False, capacity=0, fuse=False, pool=False):
+	latencies = []
+	stage_config = {'cpu': cpu, 'sleep': sleep, 'service': service}
+	system = System(fuse=fuse, pool=pool)
+	if service:
+		system.new_service(EchoService, 'benchmark-echo', None)
+	group = system.new_source(1, BenchSource, {'items': items, 'size': size})
+	for _ in range(stages):
+		stage = system.new_worker_group(workers, BenchStage, stage_config, capacity=capacity)
+		group.send_to(stage)
+		group = stage
+	group.send_to(system.new_worker_group(1, BenchSink, {'latencies': latencies}, capacity=capacity))
+
+	started = time.perf_counter()
+	system.mainloop()
+	elapsed = time.perf_counter() - started
+	System.systems.remove(system)
+	return {
+		'items': len(latencies),
+		'elapsed': elapsed,
+		'throughput': len(latencies) / elapsed,
+		'latency': percentiles(latencies),
+	}
+
+def compare(results, baseline, tolerance):
+	regressions = []
+	for name, result in results.items():
+		if name not in baseline:
+			continue
+		base = baseline[name]
+		if result['throughput'] < base['throughput'] * (1 - tolerance):
+			regressions.append('%s throughput %.0f/s < baseline %.0f/s' % (name, result['throughput'], base['throughput']))
+		for quantile, value in result['latency'].items():
+			base_value = base['latency'].get(quantile)
+			if value is not None and base_value is not None and value > base_value * (1 + tolerance):
+				regressions.append('%s latency %s %.6fs > baseline %.6fs' % (name, quantile, value, base_value))
+	return regressions
+
+def run_suite(args):
+	if args.custom:
+		scenarios = {'custom': dict(stages=args.stages, workers=args.workers, cpu=args.cpu, sleep=args.sleep, service=args.service, capacity=args.capacity, fuse=args.fuse, pool=args.pool)}
+	else:
+		scenarios = {name: SCENARIOS[name] for name in (args.scenario or SCENARIOS)}
+
+	results = {}
+	for name, options in scenarios.items():
+		result = run_pipeline(items=args.items, size=args.size, **options)
+		results[name] = dict(result, options=options)
+		print('%-8s items=%d elapsed=%.3fs throughput=%.0f/s %s' % (
+			name,
+			result['items'],
+			result['elapsed'],
+			result['throughput'],
+			' '.join('%s=%.6fs' % item for item in result['latency'].items()),
+		))
+
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump(results, f, indent=2)
+
+	if args.baseline:
+		with open(args.baseline) as f:
+			regressions = compare(results, json.load(f), args.tolerance)
+		for regression in regressions:
+			print('regression: ' + regression)
+		if regressions:
+			sys.exit(1)
+
+def run_handoff(args):
+	report('polling', measure_latency(PollingProbe, deque(), args.items, args.gap))
+	report('pipe', measure_latency(PipeProbe, Pipe(), args.items, args.gap))
+
+def main():
+	parser = argparse.ArgumentParser(description='pipeline benchmarks')
+	commands = parser.add_subparsers(dest='command', required=True)
+
+	handoff = commands.add_parser('handoff', help='pipe hand-off latency: sleep-polling deque vs blocking pipe')
+	handoff.add_argument('--items', type=int, default=5)
+	handoff.add_argument('--gap', type=float, default=2.0, help='idle seconds before each item')
+	handoff.set_defaults(func=run_handoff)
+
+	suite = commands.add_parser('pipeline', help='throughput and latency of synthetic System pipelines')
+	suite.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='run only these scenarios')
+	suite.add_argument('--custom', action='store_true', help='run one pipeline built from the options below')
+	suite.add_argument('--items', type=int, default=2000)
+	suite.add_argument('--size', type=int, default=64, help='payload bytes per item')
+	suite.add_argument('--stages', type=int, default=1)
+	suite.add_argument('--workers', type=int, default=1, help='workers per stage')
+	suite.add_argument('--cpu', type=float, default=0, help='busy seconds per item and stage')
+	suite.add_argument('--sleep', type=float, default=0, help='sleeping seconds per item and stage')
+	suite.add_argument('--service', action='store_true', help='one service round trip per item and stage')
+	suite.add_argument('--capacity', type=int, default=0)
+	suite.add_argument('--fuse', action='store_true', help='fuse linear single-worker chains')
+	suite.add_argument('--pool', action='store_true', help='run stages on the shared executor')
+	suite.add_argument('--output', help='write results as JSON')
+	suite.add_argument('--baseline', help='compare against a JSON file written by --output')
+	suite.add_argument('--tolerance', type=float, default=0.2, help='allowed relative slowdown')
+	suite.set_defaults(func=run_suite)
+
+	args = parser.parse_args()
+	args.func(args)
+
+if __name__ == '__main__':
+	main()
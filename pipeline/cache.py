@@ -0,0 +1,55 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+	def __init__(self, size=256, ttl=60):
+		self.size = size
+		self.ttl = ttl
+		self.entries = OrderedDict()
+		self.generations = {}
+		self.lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def fetch(self, key, tables, load):
+		with self.lock:
+			entry = self.entries.get(key)
+			if entry is not None:
+				expires, generations, value = entry
+				if expires > time.monotonic() and generations == self.current(tables):
+					self.entries.move_to_end(key)
+					self.hits += 1
+					return value
+				del self.entries[key]
+			self.misses += 1
+			generations = self.current(tables)
+		value = load()
+		with self.lock:
+			self.entries[key] = (time.monotonic() + self.ttl, generations, value)
+			self.entries.move_to_end(key)
+			while len(self.entries) > self.size:
+				self.entries.popitem(last=False)
+				self.evictions += 1
+		return value
+
+	def current(self, tables):
+		return tuple(self.generations.get(table, 0) for table in tables)
+
+	def invalidate(self, tables=None):
+		with self.lock:
+			if tables is None:
+				self.entries.clear()
+				tables = list(self.generations)
+			for table in tables:
+				self.generations[table] = self.generations.get(table, 0) + 1
+
+	def stats(self):
+		return {
+			'size': len(self.entries),
+			'hits': self.hits,
+			'misses': self.misses,
+			'evictions': self.evictions,
+		}
@@ -0,0 +1,66 @@
+from datetime import date, datetime
+from numbers import Number
+
+import numpy
+
+
+def to_array(values):
+	sample = next((value for value in values if value is not None), None)
+	if isinstance(sample, datetime):
+		return numpy.array(values, dtype='datetime64[us]')
+	if isinstance(sample, date):
+		return numpy.array(values, dtype='datetime64[D]')
+	array = numpy.array(values)
+	if array.dtype == object and all(isinstance(value, Number) for value in values if value is not None):
+		return numpy.array(values, dtype=float)
+	return array
+
+class ColumnBatch:
+	def __init__(self, columns):
+		self.columns = columns
+
+	@classmethod
+	def from_rows(cls, rows, fields):
+		if not rows:
+			return cls({field: numpy.array([]) for field in fields})
+		return cls({field: to_array(values) for field, values in zip(fields, zip(*rows))})
+
+	@classmethod
+	def from_records(cls, records, fields=None):
+		fields = fields or (list(records[0].keys()) if records else [])
+		return cls.from_rows([tuple(record.get(field) for field in fields) for record in records], fields)
+
+	def __len__(self):
+		for column in self.columns.values():
+			return len(column)
+		return 0
+
+	def __getitem__(self, key):
+		if isinstance(key, str):
+			return self.columns[key]
+		if isinstance(key, list) and all(isinstance(field, str) for field in key):
+			return ColumnBatch({field: self.columns[field] for field in key})
+		return ColumnBatch({field: column[key] for field, column in self.columns.items()})
+
+	def fields(self):
+		return list(self.columns)
+
+	def valid(self, field):
+		column = self.columns[field]
+		if column.dtype.kind == 'f':
+			return ~numpy.isnan(column)
+		if column.dtype.kind == 'M':
+			return ~numpy.isnat(column)
+		if column.dtype == object:
+			return column != None
+		return numpy.ones(len(column), dtype=bool)
+
+	def tolist(self, field):
+		column = self.columns[field]
+		if column.dtype.kind == 'f':
+			return [None if value != value else value for value in column.tolist()]
+		return column.tolist()
+
+	def records(self):
+		fields = self.fields()
+		return [dict(zip(fields, values)) for values in zip(*(self.tolist(field) for field in fields))]
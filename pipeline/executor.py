@@ -0,0 +1,147 @@
+from .parallel import SIGNAL_STOP, SIGNALS
+
+import os
+import threading
+import traceback
+
+
+class Executor:
+	def __init__(self, size=None, quantum=64):
+		self.size = size or os.cpu_count() or 1
+		self.quantum = quantum
+		self.groups = []
+		self.free = {}
+		self.skipped = {}
+		self.started = set()
+		self.exited = set()
+		self.cancelled = set()
+		self.lock = threading.Lock()
+		self.wakeup = threading.Condition(self.lock)
+		self.threads = []
+		self.current = {}
+		self.running = False
+
+	def add(self, worker_group):
+		worker_group.executor = self
+		self.groups.append(worker_group)
+		self.free[worker_group] = list(worker_group.worker_list)
+		self.skipped[worker_group] = 0
+		worker_group.pipe.wakers.append(self.wake)
+
+	def wake(self):
+		with self.lock:
+			self.wakeup.notify()
+
+	def start(self):
+		self.running = True
+		for worker_group in self.groups:
+			for worker in worker_group.worker_list:
+				worker.metrics.begin_idle()
+		for i in range(self.size):
+			thread = threading.Thread(target=self.work, name='executor-%d' % (i,), daemon=True)
+			self.threads.append(thread)
+			thread.start()
+
+	def abort(self, worker_group):
+		with self.lock:
+			if worker_group in self.groups:
+				self.groups.remove(worker_group)
+			self.cancelled.update(worker_group.worker_list)
+		for worker in worker_group.worker_list:
+			worker.abort()
+
+	def stop(self):
+		with self.lock:
+			self.running = False
+			self.wakeup.notify_all()
+		for thread in self.threads:
+			thread.join()
+		for worker_group in self.free:
+			for worker in worker_group.worker_list:
+				if worker not in self.exited:
+					self.exited.add(worker)
+					self.finish(worker, worker in self.started)
+
+	def acquire(self):
+		with self.lock:
+			while self.running:
+				ready = [group for group in self.groups if self.free[group] and len(group.pipe)]
+				if ready:
+					starved = [group for group in ready if self.skipped[group] >= len(self.groups)]
+					if starved:
+						worker_group = max(starved, key=lambda group: self.skipped[group])
+					else:
+						worker_group = max(ready, key=lambda group: len(group.pipe))
+					for group in ready:
+						self.skipped[group] += 1
+					self.skipped[worker_group] = 0
+					return worker_group, self.free[worker_group].pop()
+				self.wakeup.wait()
+			return None, None
+
+	def release(self, worker_group, worker, finished):
+		with self.lock:
+			if finished:
+				self.exited.add(worker)
+				if all(w in self.exited for w in worker_group.worker_list) and worker_group in self.groups:
+					self.groups.remove(worker_group)
+			else:
+				self.free[worker_group].append(worker)
+			self.wakeup.notify()
+
+	def work(self):
+		ident = threading.get_ident()
+		while True:
+			worker_group, worker = self.acquire()
+			if worker is None:
+				return
+			self.current[ident] = worker
+			try:
+				finished = not self.step(worker)
+			finally:
+				self.current[ident] = None
+			self.release(worker_group, worker, finished)
+
+	def step(self, worker):
+		worker.metrics.end_idle()
+		if worker in self.cancelled:
+			self.finish(worker, worker in self.started)
+			return False
+		if worker not in self.started:
+			self.started.add(worker)
+			worker.running = True
+			try:
+				worker.on_start()
+			except:
+				traceback.print_exc()
+				self.finish(worker, False)
+				return False
+		for _ in range(self.quantum):
+			try:
+				if worker.batch_size:
+					worker.handle_batch(worker.input.popmany(worker.batch_size, worker.batch_linger, SIGNALS, 0))
+				else:
+					data = worker.input.popleft(0)
+					if data is SIGNAL_STOP:
+						worker.abort()
+					else:
+						worker.handle(data)
+			except IndexError:
+				break
+			except:
+				traceback.print_exc()
+			if not worker.running or not len(worker.input):
+				break
+		if not worker.running:
+			self.finish(worker, True)
+			return False
+		worker.metrics.begin_idle()
+		return True
+
+	def finish(self, worker, clean):
+		try:
+			if clean:
+				worker.on_abort()
+		finally:
+			for callback in worker.exit_callbacks:
+				callback(worker)
@@ -0,0 +1,111 @@
+from .pipe import Pipe
+from .parallel import SIGNALS
+
+import os
+import pickle
+import struct
+import threading
+
+
+HEADER = struct.Struct('<I')
+
+class JournalEntry:
+	__slots__ = ('seq', 'item')
+
+	def __init__(self, seq, item):
+		self.seq = seq
+		self.item = item
+
+class JournalPipe(Pipe):
+	def __init__(self, path, capacity=0, sync=False):
+		super(JournalPipe, self).__init__(capacity)
+		self.path = path
+		self.ack_path = path + '.ack'
+		self.sync = sync
+		self.journal_lock = threading.Lock()
+		self.ack_lock = threading.Lock()
+		self.local = threading.local()
+		self.acked = 0
+		self.acked_ahead = set()
+		self.written = 0
+		self.recover()
+		self.log = open(self.path, 'ab')
+
+	def recover(self):
+		if os.path.exists(self.ack_path):
+			with open(self.ack_path) as f:
+				self.acked = int(f.read() or 0)
+		if not os.path.exists(self.path):
+			return
+		with open(self.path, 'r+b') as f:
+			valid_size = 0
+			while True:
+				header = f.read(HEADER.size)
+				if len(header) < HEADER.size:
+					break
+				size, = HEADER.unpack(header)
+				payload = f.read(size)
+				if len(payload) < size:
+					break
+				if self.written >= self.acked:
+					self.items.append(JournalEntry(self.written, pickle.loads(payload)))
+				self.written += 1
+				valid_size = f.tell()
+			f.truncate(valid_size)
+
+	def append(self, item, block=True):
+		if any(item is signal for signal in SIGNALS):
+			return super(JournalPipe, self).append(item, block)
+		payload = pickle.dumps(item, pickle.HIGHEST_PROTOCOL)
+		with self.journal_lock:
+			self.log.write(HEADER.pack(len(payload)))
+			self.log.write(payload)
+			self.log.flush()
+			if self.sync:
+				os.fsync(self.log.fileno())
+			entry = JournalEntry(self.written, item)
+			self.written += 1
+			super(JournalPipe, self).append(entry, block)
+
+	def unwrap(self, entry):
+		if not isinstance(entry, JournalEntry):
+			return entry
+		if not hasattr(self.local, 'pending'):
+			self.local.pending = []
+		self.local.pending.append(entry.seq)
+		return entry.item
+
+	def popleft(self, timeout=None):
+		return self.unwrap(super(JournalPipe, self).popleft(timeout))
+
+	def popmany(self, count, linger=0, until=(), timeout=None):
+		return [self.unwrap(entry) for entry in super(JournalPipe, self).popmany(count, linger, until, timeout)]
+
+	def hold(self):
+		pending = getattr(self.local, 'pending', None) or []
+		self.local.pending = []
+		return pending
+
+	def ack(self, held=None):
+		pending = self.hold() if held is None else held
+		if not pending:
+			return
+		with self.ack_lock:
+			self.acked_ahead.update(pending)
+			acked = self.acked
+			while self.acked in self.acked_ahead:
+				self.acked_ahead.remove(self.acked)
+				self.acked += 1
+			if self.acked == acked:
+				return
+			tmp_path = self.ack_path + '.tmp'
+			with open(tmp_path, 'w') as f:
+				f.write(str(self.acked))
+			os.replace(tmp_path, self.ack_path)
+
+	def discard(self):
+		with self.journal_lock, self.ack_lock:
+			self.log.close()
+			for path in (self.path, self.ack_path):
+				if os.path.exists(path):
+					os.remove(path)
@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import deque
+
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+class WorkerMetrics:
+	def __init__(self, sample_size=1024):
+		self.lock = threading.Lock()
+		self.items_in = 0
+		self.items_out = 0
+		self.exceptions = 0
+		self.busy_time = 0.0
+		self.idle_time = 0.0
+		self.idle_since = None
+		self.latencies = deque(maxlen=sample_size)
+
+	def begin_idle(self):
+		self.idle_since = time.perf_counter()
+
+	def end_idle(self):
+		self.idle_time += time.perf_counter() - self.idle_since
+		self.idle_since = None
+
+	def total_idle(self):
+		idle_since = self.idle_since
+		if idle_since is None:
+			return self.idle_time
+		return self.idle_time + time.perf_counter() - idle_since
+
+	def add_busy(self, count, elapsed):
+		self.items_in += count
+		self.busy_time += elapsed
+		with self.lock:
+			self.latencies.append(elapsed)
+
+	def samples(self):
+		with self.lock:
+			return list(self.latencies)
+
+def percentiles(samples):
+	samples = sorted(samples)
+	if not samples:
+		return {'p%g' % (q * 100): None for q in QUANTILES}
+	return {'p%g' % (q * 100): samples[min(len(samples) - 1, int(q * len(samples)))] for q in QUANTILES}
+
+def snapshot(kind, queue_depth, workers):
+	samples = []
+	for metrics in workers.values():
+		samples.extend(metrics.samples())
+	return {
+		'kind': kind,
+		'queue_depth': queue_depth,
+		'workers': len(workers),
+		'items_in': sum(m.items_in for m in workers.values()),
+		'items_out': sum(m.items_out for m in workers.values()),
+		'exceptions': sum(m.exceptions for m in workers.values()),
+		'busy_time': {name: m.busy_time for name, m in workers.items()},
+		'idle_time': {name: m.total_idle() for name, m in workers.items()},
+		'latency': percentiles(samples),
+	}
+
+def format_prometheus(stats):
+	def label(**kwargs):
+		return '{%s}' % ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in kwargs.items())
+
+	lines = []
+	for metric, kind, field in (
+		('pipeline_queue_depth', 'gauge', 'queue_depth'),
+		('pipeline_workers', 'gauge', 'workers'),
+		('pipeline_items_in_total', 'counter', 'items_in'),
+		('pipeline_items_out_total', 'counter', 'items_out'),
+		('pipeline_exceptions_total', 'counter', 'exceptions'),
+	):
+		lines.append('# TYPE %s %s' % (metric, kind))
+		for stage, s in stats.items():
+			lines.append('%s%s %s' % (metric, label(stage=stage, kind=s['kind']), s[field]))
+
+	for metric, field in (
+		('pipeline_busy_seconds_total', 'busy_time'),
+		('pipeline_idle_seconds_total', 'idle_time'),
+	):
+		lines.append('# TYPE %s counter' % (metric,))
+		for stage, s in stats.items():
+			for worker, value in s[field].items():
+				lines.append('%s%s %f' % (metric, label(stage=stage, worker=worker), value))
+
+	lines.append('# TYPE pipeline_process_seconds summary')
+	for stage, s in stats.items():
+		for q in QUANTILES:
+			value = s['latency']['p%g' % (q * 100)]
+			if value is not None:
+				lines.append('pipeline_process_seconds%s %f' % (label(stage=stage, quantile=q), value))
+
+	for metric, kind, field in (
+		('pipeline_cache_entries', 'gauge', 'size'),
+		('pipeline_cache_hits_total', 'counter', 'hits'),
+		('pipeline_cache_misses_total', 'counter', 'misses'),
+		('pipeline_cache_evictions_total', 'counter', 'evictions'),
+	):
+		cached = [(stage, s['cache']) for stage, s in stats.items() if 'cache' in s]
+		if cached:
+			lines.append('# TYPE %s %s' % (metric, kind))
+		for stage, cache in cached:
+			lines.append('%s%s %s' % (metric, label(stage=stage), cache[field]))
+	return '\n'.join(lines) + '\n'
@@ -1,25 +1,37 @@
+from .metrics import WorkerMetrics
+from . import shm
+
 import threading
 import traceback
+import asyncio
+import heapq
 import time
 
 
 SIGNAL_STOP = {}
+SIGNAL_RETIRE = object()
+SIGNALS = (SIGNAL_STOP, SIGNAL_RETIRE)
 
 class SimpleThread(threading.Thread):
 	def __init__(self):
 		super(SimpleThread, self).__init__()
 		self.running = False
+		self.exit_callbacks = []
 
 	def abort(self):
 		self.running = False
 
 	def run(self):
 		self.running = True
-		self.on_start()
+		try:
+			self.on_start()
 
-		self.exec()
+			self.exec()
 
-		self.on_abort()
+			self.on_abort()
+		finally:
+			for callback in self.exit_callbacks:
+				callback(self)
 
 	def exec(self):
 		pass
@@ -29,32 +41,205 @@ class SimpleThread(threading.Thread):
 		pass
 
 class SimpleWorker(SimpleThread):
+	batch_size = 0
+	batch_linger = 0
+	shared_memory = False
+	shared_transport = False
+
 	def __init__(self, pipe, config):
 		super(SimpleWorker, self).__init__()
 		self.outputs = []
 		self.input = pipe
 		self.config = config
-		self.idle_fallback = 1
+		self.metrics = WorkerMetrics()
+		self.retired = False
+		self.stage = None
+		self.retry = None
+		self.retries = []
+		self.error = None
+
+	def retire(self):
+		self.retired = True
+		self.abort()
 
 	def send_to(self, pipe):
 		self.outputs.append(pipe)
 
 	def output(self, item):
+		self.metrics.items_out += 1
 		for pipe in self.outputs:
 			pipe.append(item)
 
 	def exec(self):
 		while self.running:
 			try:
-				if len(self.input) == 0:
-					time.sleep(self.idle_fallback)
-					self.idle_fallback = min(self.idle_fallback + 1, 10)
-				else:
-					data = self.input.popleft()
-					if data is SIGNAL_STOP:
-						self.abort()
+				self.run_retries()
+				timeout = self.retry_timeout()
+				self.metrics.begin_idle()
+				try:
+					if self.batch_size:
+						items = self.input.popmany(self.batch_size, self.batch_linger, SIGNALS, timeout)
 					else:
-						self.process(data)
-						self.idle_fallback = 1
+						data = self.input.popleft(timeout)
+				except IndexError:
+					continue
+				finally:
+					self.metrics.end_idle()
+				if self.batch_size:
+					self.handle_batch(items)
+				elif data is SIGNAL_STOP:
+					self.drain_retries()
+					self.abort()
+				elif data is SIGNAL_RETIRE:
+					self.drain_retries()
+					self.retire()
+				else:
+					self.handle(data)
+			except:
+				traceback.print_exc()
+		for _, _, attempt, data, held in self.retries:
+			self.retry.dead(self, data, attempt - 1, 'aborted before retry')
+			self.input.ack(held)
+		self.retries = []
+
+	def handle(self, data, attempt=1, held=None):
+		if held is None:
+			held = self.input.hold()
+		started = time.perf_counter()
+		try:
+			if self.shared_memory:
+				self.process_shared(self.process, data)
+			else:
+				self.process(data)
+		except:
+			self.metrics.exceptions += 1
+			traceback.print_exc()
+			self.schedule_retry(data, attempt, held)
+		else:
+			self.input.ack(held)
+		self.metrics.add_busy(1, time.perf_counter() - started)
+
+	def handle_batch(self, items):
+		signal = items[-1] if any(items[-1] is s for s in SIGNALS) else None
+		if signal is not None:
+			items.pop()
+		if items:
+			held = self.input.hold()
+			started = time.perf_counter()
+			try:
+				if self.shared_memory:
+					self.process_shared(self.process_batch, items)
+				else:
+					self.process_batch(items)
 			except:
+				self.metrics.exceptions += 1
 				traceback.print_exc()
+				for index, data in enumerate(items):
+					self.schedule_retry(data, 1, held[index:index + 1])
+			else:
+				self.input.ack(held)
+			self.metrics.add_busy(len(items), time.perf_counter() - started)
+		if signal is SIGNAL_STOP:
+			self.drain_retries()
+			self.abort()
+		elif signal is SIGNAL_RETIRE:
+			self.drain_retries()
+			self.retire()
+
+	def schedule_retry(self, data, attempt, held):
+		if self.retry is None or self.shared_memory or self.shared_transport:
+			self.input.ack(held)
+			return
+		if attempt < self.retry.max_attempts:
+			heapq.heappush(self.retries, (time.monotonic() + self.retry.delay(attempt), next(self.retry.counter), attempt + 1, data, held))
+		else:
+			self.retry.dead(self, data, attempt, traceback.format_exc())
+			self.input.ack(held)
+
+	def retry_timeout(self):
+		if not self.retries:
+			return None
+		return max(0, self.retries[0][0] - time.monotonic())
+
+	def run_retries(self):
+		while self.retries and self.retries[0][0] <= time.monotonic():
+			_, _, attempt, data, held = heapq.heappop(self.retries)
+			self.handle(data, attempt, held)
+
+	def drain_retries(self):
+		while self.retries and self.running:
+			time.sleep(min(self.retry_timeout(), 1))
+			self.run_retries()
+
+	def process_shared(self, method, packed):
+		try:
+			method(shm.unpack(packed))
+		finally:
+			shm.close(packed)
+			shm.release(packed)
+
+	def process_batch(self, items):
+		for data in items:
+			try:
+				self.process(data)
+			except:
+				self.metrics.exceptions += 1
+				traceback.print_exc()
+
+class AsyncWorker(SimpleWorker):
+	concurrency = 1
+
+	def __init__(self, pipe, config):
+		super(AsyncWorker, self).__init__(pipe, config)
+		self.loop = None
+		self.tasks = set()
+
+	def abort(self):
+		super(AsyncWorker, self).abort()
+		try:
+			self.loop.call_soon_threadsafe(self.cancel_tasks)
+		except (AttributeError, RuntimeError):
+			pass
+
+	def cancel_tasks(self):
+		for task in self.tasks:
+			task.cancel()
+
+	def exec(self):
+		asyncio.run(self.exec_async())
+
+	async def exec_async(self):
+		self.loop = asyncio.get_running_loop()
+		slots = asyncio.Semaphore(self.concurrency)
+
+		def release(task):
+			self.tasks.discard(task)
+			slots.release()
+
+		while self.running:
+			await slots.acquire()
+			self.metrics.begin_idle()
+			data = await self.loop.run_in_executor(None, self.input.popleft)
+			self.metrics.end_idle()
+			if data is SIGNAL_STOP:
+				self.running = False
+				break
+			task = self.loop.create_task(self.handle_async(data))
+			self.tasks.add(task)
+			task.add_done_callback(release)
+		if self.tasks:
+			await asyncio.wait(self.tasks)
+
+	async def handle_async(self, data):
+		started = time.perf_counter()
+		try:
+			await self.process(data)
+		except asyncio.CancelledError:
+			pass
+		except:
+			self.metrics.exceptions += 1
+			traceback.print_exc()
+		self.metrics.add_busy(1, time.perf_counter() - started)
+
+	async def process(self, data):
+		pass
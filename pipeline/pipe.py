@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import deque
+
+
+class Pipe:
+	def __init__(self, capacity=0):
+		self.items = deque()
+		self.capacity = capacity
+		self.closed = False
+		self.lock = threading.Lock()
+		self.not_empty = threading.Condition(self.lock)
+		self.not_full = threading.Condition(self.lock)
+		self.wakers = []
+
+	def __len__(self):
+		return len(self.items)
+
+	def is_full(self):
+		return 0 < self.capacity <= len(self.items) and not self.closed
+
+	def append(self, item, block=True):
+		with self.lock:
+			if block:
+				self.not_full.wait_for(lambda: not self.is_full())
+			self.items.append(item)
+			self.not_empty.notify()
+		for waker in self.wakers:
+			waker()
+
+	def appendleft(self, item):
+		with self.lock:
+			self.items.appendleft(item)
+			self.not_empty.notify()
+		for waker in self.wakers:
+			waker()
+
+	def popleft(self, timeout=None):
+		with self.lock:
+			if not self.items and not self.not_empty.wait_for(lambda: self.items, timeout):
+				raise IndexError('pop from an empty pipe')
+			item = self.take()
+			if self.capacity:
+				self.not_full.notify()
+			return item
+
+	def popmany(self, count, linger=0, until=(), timeout=None):
+		items = [self.popleft(timeout)]
+		deadline = time.monotonic() + linger
+		with self.lock:
+			while len(items) < count and not any(items[-1] is item for item in until):
+				if not self.items and not self.not_empty.wait_for(lambda: self.items, deadline - time.monotonic()):
+					break
+				items.append(self.take())
+				if self.capacity:
+					self.not_full.notify()
+		return items
+
+	def take(self):
+		return self.items.popleft()
+
+	def hold(self):
+		return []
+
+	def ack(self, held=None):
+		pass
+
+	def close(self):
+		with self.lock:
+			self.closed = True
+			self.not_full.notify_all()
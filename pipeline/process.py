@@ -0,0 +1,173 @@
+from .parallel import SimpleWorker
+from .service import ServiceManager
+from . import shm
+
+import traceback
+import threading
+import multiprocessing
+
+
+class RequestChannel:
+	def __init__(self, conn, name, lock, read=False):
+		self.conn = conn
+		self.name = name
+		self.lock = lock
+		self.read = read
+
+	def put(self, req):
+		with self.lock:
+			self.conn.send(('request', self.name, {'id': req['id'], 'async': req['async'], 'read': self.read, 'data': req['data']}))
+			if req['async']:
+				req['reply'].set_result(None)
+				return
+			_, reply_id, result, error = self.conn.recv()
+		if reply_id != req['id']:
+			req['reply'].set_exception(RuntimeError('%s: reply %r does not match request %r' % (self.name, reply_id, req['id'])))
+		elif error is not None:
+			req['reply'].set_exception(error)
+		else:
+			req['reply'].set_result(result)
+
+def send_shared(conn, item):
+	packed = shm.pack(item)
+	conn.send(('output', packed))
+	shm.close(packed)
+
+def serve(conn, worker_type, config, port_types, shared_transport):
+	lock = threading.Lock()
+	for name, port_type in port_types.items():
+		port = port_type(None, RequestChannel(conn, name, lock))
+		if hasattr(port_type, 'read_port'):
+			port.read_port = RequestChannel(conn, name, lock, read=True)
+		ServiceManager.port_map[name] = port
+
+	worker = worker_type(None, config)
+	if shared_transport:
+		worker.output = lambda item: send_shared(conn, item)
+	else:
+		worker.output = lambda item: conn.send(('output', item))
+	worker.running = True
+	while True:
+		msg = conn.recv()
+		if msg is None:
+			break
+		method, data = msg
+		try:
+			if method == 'on_start':
+				worker.on_start()
+			elif method == 'on_abort':
+				worker.running = False
+				worker.on_abort()
+			else:
+				getattr(worker, method)(shm.unpack(data) if shared_transport else data)
+		except:
+			conn.send(('error', traceback.format_exc()))
+		if shared_transport:
+			shm.close(data)
+		conn.send(('done', None))
+	conn.close()
+
+class ProcessWorker(SimpleWorker):
+	def __init__(self, pipe, config, worker_type, start_method=None, shared_transport=False):
+		super(ProcessWorker, self).__init__(pipe, config)
+		self.worker_type = worker_type
+		self.shared_transport = shared_transport
+		self.batch_size = worker_type.batch_size
+		self.batch_linger = worker_type.batch_linger
+		self.context = multiprocessing.get_context(start_method)
+		self.conn = None
+		self.process_handle = None
+
+	def start(self):
+		self.conn, child_conn = self.context.Pipe()
+		port_types = {name: type(port) for name, port in ServiceManager.port_map.items()}
+		self.process_handle = self.context.Process(target=serve, args=(child_conn, self.worker_type, self.config, port_types, self.shared_transport), daemon=True)
+		self.process_handle.start()
+		child_conn.close()
+		super(ProcessWorker, self).start()
+
+	def on_start(self):
+		try:
+			self.call('on_start', None)
+		except:
+			self.stop_process()
+			raise
+
+	def on_abort(self):
+		try:
+			if self.error is None:
+				self.call('on_abort', None)
+		finally:
+			self.stop_process()
+
+	def stop_process(self):
+		try:
+			self.conn.send(None)
+		except OSError:
+			pass
+		self.process_handle.join(5)
+		if self.process_handle.is_alive():
+			self.process_handle.terminate()
+		self.conn.close()
+
+	def call(self, method, data):
+		try:
+			self.exchange(method, data)
+		except (EOFError, ConnectionError) as e:
+			self.process_handle.join(1)
+			self.error = ChildProcessError('%s: worker process exited with code %s during %s' % (self.name, self.process_handle.exitcode, method))
+			self.abort()
+			raise self.error from e
+
+	def exchange(self, method, data):
+		if not self.process_handle.is_alive():
+			raise EOFError('worker process is not running')
+		if self.shared_transport:
+			data = shm.pack(data)
+			self.conn.send((method, data))
+			shm.close(data)
+		else:
+			self.conn.send((method, data))
+		error = None
+		while True:
+			msg = self.conn.recv()
+			if msg[0] == 'output':
+				if not self.shared_transport:
+					self.output(msg[1])
+				elif self.outputs:
+					shm.retain(msg[1], len(self.outputs))
+					self.output(msg[1])
+				else:
+					shm.release(msg[1])
+			elif msg[0] == 'request':
+				_, name, req = msg
+				try:
+					port = ServiceManager.get(name)
+					result = port.request(req['data'], req['async'], getattr(port, 'read_port', None) if req['read'] else None)
+					reply = ('reply', req['id'], result, None)
+				except Exception as e:
+					reply = ('reply', req['id'], None, e)
+				if not req['async']:
+					self.send_reply(reply)
+			elif msg[0] == 'error':
+				error = msg[1]
+			else:
+				if self.shared_transport:
+					shm.release(data)
+				if error is not None:
+					raise ChildProcessError(error)
+				return
+
+	def send_reply(self, reply):
+		try:
+			self.conn.send(reply)
+		except Exception:
+			what = 'result' if reply[3] is None else repr(reply[3])
+			error = RuntimeError('could not return %s to the worker process:\n%s' % (what, traceback.format_exc()))
+			self.conn.send(('reply', reply[1], None, error))
+
+	def process(self, data):
+		self.call('process', data)
+
+	def process_batch(self, items):
+		self.call('process_batch', items)
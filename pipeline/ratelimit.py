@@ -0,0 +1,71 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class RateLimiter:
+	limiters = dict()
+	registry_lock = threading.Lock()
+
+	@classmethod
+	def get(cls, url, **config):
+		host = urlsplit(url).hostname or url
+		with cls.registry_lock:
+			if host not in cls.limiters:
+				cls.limiters[host] = cls(host, **config)
+			return cls.limiters[host]
+
+	def __init__(self, host, rate=1.0, burst=1, min_rate=None, max_rate=None, target_latency=2.0, increase=0.05, decrease=0.5):
+		self.host = host
+		self.rate = rate
+		self.burst = burst
+		self.min_rate = rate / 10 if min_rate is None else min_rate
+		self.max_rate = rate if max_rate is None else max_rate
+		self.target_latency = target_latency
+		self.increase = increase
+		self.decrease = decrease
+		self.tokens = burst
+		self.updated = time.monotonic()
+		self.lock = threading.Lock()
+		self.changed = threading.Condition(self.lock)
+
+	def refill(self):
+		now = time.monotonic()
+		self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+		self.updated = now
+
+	def acquire(self, timeout=None):
+		deadline = None if timeout is None else time.monotonic() + timeout
+		with self.lock:
+			while True:
+				self.refill()
+				if self.tokens >= 1:
+					self.tokens -= 1
+					return True
+				wait = (1 - self.tokens) / self.rate
+				if deadline is not None:
+					remain = deadline - time.monotonic()
+					if remain <= 0:
+						return False
+					wait = min(wait, remain)
+				self.changed.wait(wait)
+
+	def report(self, latency, ok=True):
+		with self.lock:
+			self.refill()
+			if ok and latency <= self.target_latency:
+				self.rate = min(self.max_rate, self.rate + self.increase)
+			else:
+				self.rate = max(self.min_rate, self.rate * self.decrease)
+			self.changed.notify_all()
+
+	def call(self, fn, *args, **kwargs):
+		started = time.monotonic()
+		try:
+			result = fn(*args, **kwargs)
+		except:
+			self.report(time.monotonic() - started, ok=False)
+			raise
+		status = getattr(result, 'status_code', 200)
+		self.report(time.monotonic() - started, ok=status < 500 and status != 429)
+		return result
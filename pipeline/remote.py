@@ -0,0 +1,146 @@
+from .parallel import SimpleThread
+
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+from multiprocessing.connection import Client, Connection, AuthenticationError, answer_challenge, deliver_challenge
+
+
+def open_socket(address):
+	if isinstance(address, str):
+		return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	return socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+def default_authkey(authkey):
+	return authkey if authkey is not None else multiprocessing.current_process().authkey
+
+class RemoteServer(SimpleThread):
+	def __init__(self, address, groups, sources=1, authkey=None):
+		super(RemoteServer, self).__init__()
+		self.address = address
+		self.groups = groups
+		self.authkey = default_authkey(authkey)
+		self.connections = []
+		self.lock = threading.Lock()
+		for group in groups.values():
+			group.source_count += sources
+
+		if isinstance(address, str) and os.path.exists(address):
+			os.remove(address)
+		self.listener = open_socket(address)
+		if not isinstance(address, str):
+			self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self.listener.bind(address)
+		self.listener.listen()
+		self.listener.settimeout(0.2)
+
+	def exec(self):
+		while self.running:
+			try:
+				sock, _ = self.listener.accept()
+			except socket.timeout:
+				continue
+			except OSError:
+				break
+			sock.setblocking(True)
+			conn = Connection(sock.detach())
+			with self.lock:
+				self.connections.append(conn)
+			threading.Thread(target=self.receive, args=(conn,), daemon=True).start()
+
+	def on_abort(self):
+		self.listener.close()
+		if isinstance(self.address, str) and os.path.exists(self.address):
+			os.remove(self.address)
+		with self.lock:
+			for conn in self.connections:
+				conn.close()
+
+	def receive(self, conn):
+		group = None
+		try:
+			try:
+				deliver_challenge(conn, self.authkey)
+				answer_challenge(conn, self.authkey)
+			except (AuthenticationError, EOFError, OSError) as e:
+				print('%s: rejected connection: %s' % (self.address, e))
+				return
+			_, name = conn.recv()
+			group = self.groups[name]
+			inlet = group.inlet()
+			while True:
+				kind, item = conn.recv()
+				if kind == 'eos':
+					break
+				inlet.append(item)
+		except EOFError:
+			if group is not None:
+				print('%s: connection closed before end of stream' % (group.name,))
+		except:
+			if self.running:
+				traceback.print_exc()
+		finally:
+			conn.close()
+			with self.lock:
+				if conn in self.connections:
+					self.connections.remove(conn)
+		if group is not None and self.running:
+			group.set_source_empty()
+
+class RemoteGroup:
+	def __init__(self, address, name, connect_timeout=30, authkey=None):
+		self.address = address
+		self.name = name
+		self.connect_timeout = connect_timeout
+		self.authkey = default_authkey(authkey)
+		self.source_count = 0
+		self.pipes = [self]
+		self.conn = None
+		self.lock = threading.Lock()
+		self.done = threading.Event()
+
+	def partition(self):
+		pass
+
+	def inlet(self):
+		return self
+
+	def is_alive(self):
+		return not self.done.is_set()
+
+	def connect(self):
+		deadline = time.monotonic() + self.connect_timeout
+		while True:
+			try:
+				conn = Client(self.address, authkey=self.authkey)
+				break
+			except OSError:
+				if time.monotonic() > deadline:
+					raise
+				time.sleep(0.1)
+		conn.send(('hello', self.name))
+		self.conn = conn
+
+	def append(self, item, block=True):
+		with self.lock:
+			if self.conn is None:
+				self.connect()
+			self.conn.send(('item', item))
+
+	def set_source_empty(self):
+		with self.lock:
+			self.source_count -= 1
+			if self.source_count > 0:
+				return
+			if self.conn is None:
+				self.connect()
+			self.conn.send(('eos', None))
+			try:
+				self.conn.recv()
+			except EOFError:
+				pass
+			self.conn.close()
+		self.done.set()
@@ -0,0 +1,88 @@
+from .parallel import SimpleWorker
+
+import itertools
+import os
+import pickle
+import threading
+import time
+
+
+class DeadLetterStore:
+	lock = threading.Lock()
+
+	def __init__(self, path):
+		self.path = path
+
+	def put(self, entry):
+		with self.lock:
+			with open(self.path, 'ab') as f:
+				pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+
+	def entries(self, stage=None):
+		entries = []
+		if not os.path.exists(self.path):
+			return entries
+		with open(self.path, 'rb') as f:
+			while True:
+				try:
+					entry = pickle.load(f)
+				except EOFError:
+					break
+				except pickle.UnpicklingError:
+					print('%s: skipping truncated entry' % (self.path,))
+					break
+				if stage is None or entry['stage'] == stage:
+					entries.append(entry)
+		return entries
+
+	def remove(self, count, stage=None):
+		with self.lock:
+			kept = []
+			for entry in self.entries():
+				if count and (stage is None or entry['stage'] == stage):
+					count -= 1
+				else:
+					kept.append(entry)
+			if not kept:
+				if os.path.exists(self.path):
+					os.remove(self.path)
+				return
+			tmp_path = self.path + '.tmp'
+			with open(tmp_path, 'wb') as f:
+				for entry in kept:
+					pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+			os.replace(tmp_path, self.path)
+
+class RetryPolicy:
+	def __init__(self, max_attempts=3, backoff=1, factor=2, max_backoff=300, dead_letter=None):
+		self.max_attempts = max_attempts
+		self.backoff = backoff
+		self.factor = factor
+		self.max_backoff = max_backoff
+		self.dead_letter = DeadLetterStore(dead_letter) if isinstance(dead_letter, str) else dead_letter
+		self.counter = itertools.count()
+
+	def delay(self, attempt):
+		return min(self.max_backoff, self.backoff * self.factor ** (attempt - 1))
+
+	def dead(self, worker, item, attempts, error):
+		if self.dead_letter is None:
+			print('%s: giving up on %r after %d attempts' % (worker.name, item, attempts))
+			return
+		self.dead_letter.put({
+			'stage': worker.stage or worker.name,
+			'worker': worker.name,
+			'item': item,
+			'attempts': attempts,
+			'error': error,
+			'time': time.time(),
+		})
+
+class DeadLetterSource(SimpleWorker):
+	def process(self, dummy):
+		path, stage = self.config if isinstance(self.config, tuple) else (self.config, None)
+		store = DeadLetterStore(path)
+		entries = store.entries(stage)
+		for entry in entries:
+			self.output(entry['item'])
+		store.remove(len(entries), stage)
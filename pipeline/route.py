@@ -0,0 +1,62 @@
+from . import shm
+
+import itertools
+
+
+class KeyRoute:
+	def __init__(self, pipes, key):
+		self.pipes = pipes
+		self.key = key
+
+	def append(self, item, block=True):
+		self.pipes[hash(self.key(item)) % len(self.pipes)].append(item, block)
+
+class RoundRobinRoute:
+	def __init__(self, pipes):
+		self.pipes = pipes
+		self.counter = itertools.count()
+
+	def __len__(self):
+		return sum(len(pipe) for pipe in self.pipes)
+
+	def append(self, item, block=True):
+		self.pipes[next(self.counter) % len(self.pipes)].append(item, block)
+
+class FilterRoute:
+	def __init__(self, route, predicate):
+		self.route = route
+		self.predicate = predicate
+
+	def append(self, item, block=True):
+		if self.predicate(item):
+			self.route.append(item, block)
+		elif shm.registry.counts:
+			shm.release(item)
+
+class FusedOutlet:
+	def __init__(self, worker):
+		self.worker = worker
+		self.started = False
+
+	def append(self, item, block=True):
+		if not self.started:
+			self.start()
+		if self.worker.batch_size:
+			self.worker.handle_batch([item])
+		else:
+			self.worker.handle(item)
+
+	def start(self):
+		self.started = True
+		self.worker.running = True
+		self.worker.on_start()
+
+	def finish(self):
+		try:
+			if not self.started:
+				self.start()
+			self.worker.running = False
+			self.worker.on_abort()
+		finally:
+			for callback in self.worker.exit_callbacks:
+				callback(self.worker)
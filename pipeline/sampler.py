@@ -0,0 +1,67 @@
+from .parallel import SimpleThread
+
+import os
+import sys
+import threading
+from collections import Counter
+
+
+class Sampler(SimpleThread):
+	def __init__(self, system, path, interval=0.005, top=20):
+		super(Sampler, self).__init__()
+		self.system = system
+		self.path = path
+		self.interval = interval
+		self.top = top
+		self.stacks = Counter()
+		self.stopped = threading.Event()
+
+	def abort(self):
+		super(Sampler, self).abort()
+		self.stopped.set()
+
+	def exec(self):
+		while not self.stopped.wait(self.interval):
+			self.sample()
+
+	def on_abort(self):
+		self.write()
+
+	def sample(self):
+		threads = self.system.stage_threads()
+		for ident, frame in sys._current_frames().items():
+			if ident not in threads:
+				continue
+			stage, metrics = threads[ident]
+			if metrics.idle_since is not None:
+				continue
+			stack = []
+			while frame is not None:
+				code = frame.f_code
+				stack.append('%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+				frame = frame.f_back
+			stack.append(stage)
+			self.stacks[tuple(reversed(stack))] += 1
+
+	def write(self):
+		with open(self.path, 'w') as f:
+			for stack, count in self.stacks.most_common():
+				f.write('%s %d\n' % (';'.join(stack), count))
+
+		totals = Counter()
+		exclusive = {}
+		inclusive = {}
+		for stack, count in self.stacks.items():
+			stage = stack[0]
+			totals[stage] += count
+			exclusive.setdefault(stage, Counter())[stack[-1]] += count
+			for function in set(stack[1:]):
+				inclusive.setdefault(stage, Counter())[function] += count
+
+		with open(self.path + '.txt', 'w') as f:
+			for stage, total in totals.most_common():
+				f.write('== %s (%d samples)\n' % (stage, total))
+				f.write('%8s %8s  %s\n' % ('self%', 'total%', 'function'))
+				for function, count in exclusive[stage].most_common(self.top):
+					f.write('%8.1f %8.1f  %s\n' % (100 * count / total, 100 * inclusive[stage][function] / total, function))
+				f.write('\n')
@@ -1,8 +1,12 @@
-from .parallel import SimpleThread
+from .parallel import SimpleThread, SIGNAL_STOP
+from .metrics import WorkerMetrics, snapshot
 
-import threading
+import asyncio
+import itertools
 import queue
 import traceback
+import time
+from concurrent.futures import Future
 
 
 class ServiceManager:
@@ -19,34 +23,101 @@ class ServiceManager:
 		return cls.port_map[name]
 
 class ServiceWorker(SimpleThread):
+	pipeline_depth = 64
+
 	def __init__(self, config, pipe_out, pipe_in):
 		super(ServiceWorker, self).__init__()
 		self.config = config
 		self.pipe_out = pipe_out
 		self.pipe_in = pipe_in
+		self.metrics = WorkerMetrics()
+
+	def stats(self):
+		return snapshot('service', self.pipe_in.qsize(), {self.name: self.metrics})
+
+	def abort(self):
+		super(ServiceWorker, self).abort()
+		self.pipe_in.put(SIGNAL_STOP)
+
+	def bind(self, port):
+		pass
 
 	def exec(self):
 		while self.running:
-			result = {}
-			try:
-				req = self.pipe_in.get(timeout=1)
+			self.metrics.begin_idle()
+			requests = [self.pipe_in.get()]
+			self.metrics.end_idle()
+			while requests[-1] is not SIGNAL_STOP and len(requests) < self.pipeline_depth:
 				try:
-					result = self.process(req['data'])
-				except:
-					traceback.print_exc()
-				if not req['async']:
-					self.pipe_out.put(result)
-			except queue.Empty:
-				pass
+					requests.append(self.pipe_in.get_nowait())
+				except queue.Empty:
+					break
+			if requests[-1] is SIGNAL_STOP:
+				requests.pop()
+				self.handle_requests(requests)
+				break
+			self.handle_requests(requests)
+
+	def handle_requests(self, requests):
+		for req in requests:
+			self.handle(req)
+
+	def handle(self, req):
+		started = time.perf_counter()
+		try:
+			result = self.process(req['data'])
+		except Exception as e:
+			self.metrics.exceptions += 1
+			traceback.print_exc()
+			req['reply'].set_exception(e)
+		else:
+			req['reply'].set_result(result)
+		self.metrics.add_busy(1, time.perf_counter() - started)
+		if not req['async']:
+			self.metrics.items_out += 1
 
 	class Port:
 		def __init__(self, service_output, service_port):
 			self.service_port = service_port
 			self.service_output = service_output
-			self.lock = threading.Lock()
+			self.ids = itertools.count()
+
+		def submit(self, data, no_wait=False, port=None):
+			reply = Future()
+			(port or self.service_port).put({'id': next(self.ids), 'async': no_wait, 'data': data, 'reply': reply})
+			return reply
+
+		def request(self, data, no_wait=True, port=None):
+			reply = self.submit(data, no_wait, port)
+			if not no_wait:
+				return reply.result()
+
+		@property
+		def futures(self):
+			return FuturePort(self)
+
+		@property
+		def aio(self):
+			return AsyncPort(self)
+
+class FuturePort:
+	def __init__(self, port):
+		self.port = port
+
+	def __getattr__(self, name):
+		value = getattr(self.port, name)
+		if not callable(value):
+			return value
+		method = getattr(type(self.port), name)
+		return lambda *args, **kwargs: method(self, *args, **kwargs)
+
+	def request(self, data, no_wait=True, port=None):
+		if no_wait:
+			return self.port.request(data, no_wait, port)
+		return self.port.submit(data, port=port)
 
-		def request(self, data, no_wait=True):
-			with self.lock:
-				self.service_port.put({'async': no_wait, 'data': data})
-				if not no_wait:
-					return self.service_output.get()
+class AsyncPort(FuturePort):
+	def request(self, data, no_wait=True, port=None):
+		if no_wait:
+			return self.port.request(data, no_wait, port)
+		return asyncio.wrap_future(self.port.submit(data, port=port))
@@ -0,0 +1,158 @@
+import threading
+from multiprocessing import shared_memory, resource_tracker
+
+try:
+	import numpy
+	from .columns import ColumnBatch
+except ImportError:
+	numpy = None
+	ColumnBatch = ()
+
+try:
+	import pandas
+except ImportError:
+	pandas = None
+
+
+def attach(name):
+	block = shared_memory.SharedMemory(name)
+	resource_tracker.unregister(block._name, 'shared_memory')
+	return block
+
+class SharedArray:
+	def __init__(self, name, shape, dtype):
+		self.name = name
+		self.shape = shape
+		self.dtype = dtype
+		self.block = None
+
+	def __getstate__(self):
+		return (self.name, self.shape, self.dtype)
+
+	def __setstate__(self, state):
+		self.name, self.shape, self.dtype = state
+		self.block = None
+
+	@classmethod
+	def create(cls, array):
+		block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+		resource_tracker.unregister(block._name, 'shared_memory')
+		numpy.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+		handle = cls(block.name, array.shape, array.dtype.str)
+		handle.block = block
+		return handle
+
+	def array(self):
+		if self.block is None:
+			self.block = attach(self.name)
+		return numpy.ndarray(self.shape, numpy.dtype(self.dtype), buffer=self.block.buf)
+
+class SharedFrame:
+	def __init__(self, columns, index):
+		self.columns = columns
+		self.index = index
+
+	@classmethod
+	def create(cls, frame):
+		return cls({name: pack(frame[name].to_numpy()) for name in frame.columns}, pack(frame.index.to_numpy()))
+
+	def frame(self):
+		return pandas.DataFrame({name: unpack(column) for name, column in self.columns.items()}, index=unpack(self.index), copy=False)
+
+class Registry:
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.counts = {}
+
+	def retain(self, handle, count):
+		with self.lock:
+			self.counts[handle.name] = self.counts.get(handle.name, 0) + count
+
+	def release(self, handle):
+		with self.lock:
+			count = self.counts.get(handle.name, 1) - 1
+			if count > 0:
+				self.counts[handle.name] = count
+				return
+			self.counts.pop(handle.name, None)
+		self.unlink(handle.name)
+
+	def release_all(self):
+		with self.lock:
+			names = list(self.counts)
+			self.counts.clear()
+		for name in names:
+			self.unlink(name)
+
+	@staticmethod
+	def unlink(name):
+		try:
+			block = shared_memory.SharedMemory(name)
+			block.close()
+			block.unlink()
+		except FileNotFoundError:
+			pass
+
+registry = Registry()
+
+def is_packable(item):
+	return (numpy is not None and isinstance(item, numpy.ndarray) and item.dtype != object) \
+		or (pandas is not None and isinstance(item, pandas.DataFrame))
+
+def pack(item):
+	if isinstance(item, (SharedArray, SharedFrame)):
+		return item
+	elif is_packable(item):
+		return SharedArray.create(item) if isinstance(item, numpy.ndarray) else SharedFrame.create(item)
+	elif isinstance(item, ColumnBatch):
+		return ColumnBatch(pack(item.columns))
+	elif isinstance(item, dict):
+		return {k: pack(v) for k, v in item.items()}
+	elif isinstance(item, (list, tuple)):
+		return type(item)(pack(v) for v in item)
+	return item
+
+def unpack(item):
+	if isinstance(item, SharedArray):
+		return item.array()
+	elif isinstance(item, SharedFrame):
+		return item.frame()
+	elif isinstance(item, ColumnBatch):
+		return ColumnBatch(unpack(item.columns))
+	elif isinstance(item, dict):
+		return {k: unpack(v) for k, v in item.items()}
+	elif isinstance(item, (list, tuple)):
+		return type(item)(unpack(v) for v in item)
+	return item
+
+def handles(item):
+	if isinstance(item, SharedArray):
+		yield item
+	elif isinstance(item, SharedFrame):
+		yield from handles(item.columns)
+		yield from handles(item.index)
+	elif isinstance(item, ColumnBatch):
+		yield from handles(item.columns)
+	elif isinstance(item, dict):
+		for v in item.values():
+			yield from handles(v)
+	elif isinstance(item, (list, tuple)):
+		for v in item:
+			yield from handles(v)
+
+def close(item):
+	for handle in handles(item):
+		if handle.block is not None:
+			try:
+				handle.block.close()
+				handle.block = None
+			except BufferError:
+				pass
+
+def retain(item, count=1):
+	for handle in handles(item):
+		registry.retain(handle, count)
+
+def release(item):
+	for handle in handles(item):
+		registry.release(handle)
@@ -0,0 +1,66 @@
+from .pipe import Pipe
+from .parallel import SIGNALS
+
+import pickle
+import struct
+import tempfile
+
+
+HEADER = struct.Struct('<bI')
+
+class SpillPipe(Pipe):
+	def __init__(self, memory_items, spill_dir=None):
+		super(SpillPipe, self).__init__()
+		self.memory_items = max(memory_items, 1)
+		self.spill_dir = spill_dir
+		self.spill_file = None
+		self.spilled = 0
+		self.read_offset = 0
+		self.write_offset = 0
+
+	def __len__(self):
+		return len(self.items) + self.spilled
+
+	def append(self, item, block=True):
+		with self.lock:
+			if self.spilled or len(self.items) >= self.memory_items:
+				self.spill(item)
+			else:
+				self.items.append(item)
+			self.not_empty.notify()
+		for waker in self.wakers:
+			waker()
+
+	def spill(self, item):
+		if self.spill_file is None:
+			self.spill_file = tempfile.TemporaryFile(dir=self.spill_dir)
+		for index, signal in enumerate(SIGNALS):
+			if item is signal:
+				kind, payload = index, b''
+				break
+		else:
+			kind, payload = -1, pickle.dumps(item, pickle.HIGHEST_PROTOCOL)
+		self.spill_file.seek(self.write_offset)
+		self.spill_file.write(HEADER.pack(kind, len(payload)))
+		self.spill_file.write(payload)
+		self.write_offset = self.spill_file.tell()
+		self.spilled += 1
+
+	def take(self):
+		item = self.items.popleft()
+		if self.spilled and len(self.items) < self.memory_items // 2 + 1:
+			self.refill()
+		return item
+
+	def refill(self):
+		self.spill_file.seek(self.read_offset)
+		while self.spilled and len(self.items) < self.memory_items:
+			kind, size = HEADER.unpack(self.spill_file.read(HEADER.size))
+			payload = self.spill_file.read(size)
+			self.items.append(SIGNALS[kind] if kind >= 0 else pickle.loads(payload))
+			self.spilled -= 1
+		self.read_offset = self.spill_file.tell()
+		if not self.spilled:
+			self.spill_file.seek(0)
+			self.spill_file.truncate()
+			self.read_offset = self.write_offset = 0
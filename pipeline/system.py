@@ -1,63 +1,250 @@
 from .service import ServiceManager
-from .parallel import SIGNAL_STOP
-import time
+from .parallel import SIGNAL_STOP, SIGNAL_RETIRE, SimpleThread, SimpleWorker
+from .pipe import Pipe
+from .journal import JournalPipe
+from .spill import SpillPipe
+from .route import KeyRoute, RoundRobinRoute, FilterRoute, FusedOutlet
+from .process import ProcessWorker
+from .autoscale import Autoscaler
+from .sampler import Sampler
+from .remote import RemoteServer, RemoteGroup
+from .executor import Executor
+from .metrics import snapshot, format_prometheus
+from . import shm
+import os
 import signal
 import threading
-from collections import deque
 
 
 class WorkerGroup:
-	def __init__(self, worker_count, worker_type, config=None):
-		self.pipe = deque()
-		self.worker_list = [worker_type(self.pipe, config) for i in range(worker_count)]
+	def __init__(self, worker_count, worker_type, config=None, capacity=0, name=None, max_count=None, journal=None, spill=0, retry=None):
+		self.capacity = capacity
+		self.journal = journal
+		self.spill = spill
+		self.retry = retry
+		self.pipe = self.new_pipe()
+		self.pipes = [self.pipe]
+		self.worker_type = worker_type
+		self.config = config
+		self.name = name or worker_type.__name__
+		self.min_count = worker_count
+		self.max_count = max_count or worker_count
+		self.worker_list = []
 		self.consumers = []
+		self.done_callbacks = []
+		self.error_callbacks = []
 		self.started = threading.Event()
+		self.done = threading.Event()
+		self.lock = threading.Lock()
 		self.source_count = 0
+		self.exited_count = 0
+		self.retiring_count = 0
+		self.stopping = False
+		self.outlet = None
+		self.executor = None
+		for i in range(worker_count):
+			self.add_worker()
 
-	def set_source_empty(self):
-		self.source_count -= 1
-		if self.source_count <= 0:
-			for _ in self.worker_list:
-				self.pipe.append(SIGNAL_STOP)
-			threading.Thread(target=self.wait_and_notify_done).start()
+	def new_pipe(self, index=None):
+		if self.journal is not None:
+			return JournalPipe(self.journal if index is None else '%s.%d' % (self.journal, index), self.capacity)
+		if self.spill:
+			return SpillPipe(self.spill)
+		return Pipe(self.capacity)
+
+	def new_worker(self):
+		return self.worker_type(self.pipe, self.config)
+
+	def add_worker(self):
+		worker = self.new_worker()
+		worker.name = '%s-%d' % (self.name, len(self.worker_list))
+		worker.stage = self.name
+		worker.retry = self.retry
+		worker.exit_callbacks.append(self.on_worker_exit)
+		self.worker_list.append(worker)
+		return worker
+
+	def stats(self):
+		return snapshot('group', self.backlog(), {worker.name: worker.metrics for worker in self.worker_list})
+
+	def backlog(self):
+		return sum(len(pipe) for pipe in self.pipes)
+
+	def partition(self):
+		if len(self.pipes) > 1 or len(self.worker_list) < 2:
+			return
+		if self.source_count:
+			raise ValueError('%s: keyed send_to must be wired before any other source' % (self.name,))
+		self.max_count = self.min_count
+		if isinstance(self.pipe, JournalPipe):
+			self.pipe.discard()
+		self.pipes = [self.new_pipe(index) for index in range(len(self.worker_list))]
+		self.pipe = RoundRobinRoute(self.pipes)
+		for worker, pipe in zip(self.worker_list, self.pipes):
+			worker.input = pipe
 
-	def wait_and_notify_done(self):
-		self.started.wait()
-		self.join()
+	def inlet(self):
+		return self.pipe
+
+	def live_count(self):
+		return len(self.worker_list) - self.exited_count - self.retiring_count
+
+	def autoscaled(self):
+		return self.max_count > self.min_count
+
+	def scale_up(self):
+		with self.lock:
+			if self.done.is_set() or self.live_count() >= self.max_count:
+				return None
+			outputs = self.worker_list[0].outputs
+			worker = self.add_worker()
+			worker.outputs = list(outputs)
+			if self.stopping:
+				self.pipe.append(SIGNAL_STOP, block=False)
+			if self.started.is_set():
+				worker.start()
+			return worker
+
+	def scale_down(self):
+		with self.lock:
+			if self.stopping or self.live_count() <= self.min_count:
+				return False
+			self.retiring_count += 1
+			self.pipe.appendleft(SIGNAL_RETIRE)
+			return True
+
+	def on_worker_exit(self, worker):
+		if worker.error is not None:
+			for callback in self.error_callbacks:
+				callback(self, worker.error)
+		with self.lock:
+			self.exited_count += 1
+			if worker.retired:
+				self.retiring_count -= 1
+			if self.exited_count < len(self.worker_list):
+				return
+		self.done.set()
 
 		for consumer in self.consumers:
 			consumer.set_source_empty()
+		for callback in self.done_callbacks:
+			callback(self)
+
+	def set_source_empty(self):
+		with self.lock:
+			self.source_count -= 1
+			if self.source_count > 0:
+				return
+			if self.outlet is None:
+				self.stopping = True
+				if len(self.pipes) > 1:
+					for pipe in self.pipes:
+						pipe.append(SIGNAL_STOP, block=False)
+					return
+				for _ in range(self.live_count()):
+					self.pipe.append(SIGNAL_STOP, block=False)
+				return
+		self.outlet.finish()
 
 	def is_alive(self):
-		return any(worker.is_alive() for worker in self.worker_list)
+		return not self.done.is_set()
 
-	def send_to(self, worker_group):
-		self.consumers.append(worker_group)
-		worker_group.source_count += 1
-		consumer_pipe = worker_group.pipe
+	def send_to(self, worker_group, key=None, when=None):
+		groups = worker_group if isinstance(worker_group, (list, tuple)) else [worker_group]
+		if key is not None and len(groups) == 1:
+			worker_group.partition()
+			route = KeyRoute(worker_group.pipes, key)
+		elif key is not None:
+			route = KeyRoute([group.inlet() for group in groups], key)
+		elif len(groups) > 1:
+			route = RoundRobinRoute([group.inlet() for group in groups])
+		else:
+			route = worker_group.inlet()
+		if when is not None:
+			route = FilterRoute(route, when)
+
+		for group in groups:
+			self.consumers.append(group)
+			group.source_count += 1
 		for worker in self.worker_list:
-			worker.send_to(consumer_pipe)
+			worker.send_to(route)
 		return worker_group
 
+	def fuse(self):
+		self.outlet = FusedOutlet(self.worker_list[0])
+		return self.outlet
+
 	def start(self):
-		if self.started.is_set():
-			return
-		for worker in self.worker_list:
-			worker.start()
-		self.started.set()
+		with self.lock:
+			if self.started.is_set():
+				return
+			if self.outlet is None and self.executor is None:
+				for worker in self.worker_list:
+					worker.start()
+			self.started.set()
 
 	def abort(self):
+		for pipe in self.pipes:
+			pipe.close()
 		if not self.started.is_set():
 			return
+		if self.executor is not None:
+			self.executor.abort(self)
+			return
 		for worker in self.worker_list:
 			if worker.is_alive():
-				self.pipe.appendleft(SIGNAL_STOP)
+				worker.input.appendleft(SIGNAL_STOP)
 				worker.abort()
 
 	def join(self):
+		if self.outlet is not None or self.executor is not None:
+			return
 		for worker in self.worker_list:
 			worker.join()
 
+class ProcessWorkerGroup(WorkerGroup):
+	def __init__(self, worker_count, worker_type, config=None, start_method=None, shared_memory=False, **options):
+		self.start_method = start_method
+		self.shared_memory = shared_memory
+		super(ProcessWorkerGroup, self).__init__(worker_count, worker_type, config, **options)
+
+	def new_worker(self):
+		return ProcessWorker(self.pipe, self.config, self.worker_type, self.start_method, self.shared_memory)
+
+class AsyncWorkerGroup(WorkerGroup):
+	def __init__(self, concurrency, worker_type, config=None, **options):
+		unsupported = [option for option in ('journal', 'retry', 'max_count') if options.get(option) is not None]
+		if unsupported:
+			raise ValueError('%s: async groups do not support %s' % (worker_type.__name__, ', '.join(unsupported)))
+		super(AsyncWorkerGroup, self).__init__(1, worker_type, config, **options)
+		for worker in self.worker_list:
+			worker.concurrency = concurrency
+
+class StatsExporter(SimpleThread):
+	def __init__(self, system, path, interval):
+		super(StatsExporter, self).__init__()
+		self.system = system
+		self.path = path
+		self.interval = interval
+		self.stopped = threading.Event()
+
+	def abort(self):
+		super(StatsExporter, self).abort()
+		self.stopped.set()
+
+	def exec(self):
+		while not self.stopped.wait(self.interval):
+			self.write()
+
+	def on_abort(self):
+		self.write()
+
+	def write(self):
+		tmp_path = self.path + '.tmp'
+		with open(tmp_path, 'w') as f:
+			f.write(format_prometheus(self.system.stats()))
+		os.replace(tmp_path, self.path)
+
 class System:
 	systems = []
 	@classmethod
@@ -65,50 +252,193 @@ class System:
 		for system in cls.systems:
 			system.abort()
 
-	def __init__(self):
+	def __init__(self, fuse=False, pool=False):
 		self.running = True
+		self.fuse = fuse
+		self.executor = Executor(None if pool is True else pool) if pool else None
 		self.services = []
 		self.worker_groups = []
+		self.finished = threading.Event()
+		self.monitors = []
+		self.servers = []
+		self.errors = []
+		self.autoscaler = Autoscaler(self)
 		self.__class__.systems.append(self)
 
 	def abort(self):
 		self.running = False
+		self.finished.set()
+
+	def stage_name(self, name):
+		names = set(group.name for group in self.worker_groups) | set(service.name for service in self.services)
+		unique_name = name
+		index = 1
+		while unique_name in names:
+			index += 1
+			unique_name = '%s#%d' % (name, index)
+		return unique_name
+
+	def add_worker_group(self, worker_group):
+		worker_group.name = self.stage_name(worker_group.name)
+		for index, worker in enumerate(worker_group.worker_list):
+			worker.name = '%s-%d' % (worker_group.name, index)
+			worker.stage = worker_group.name
+		worker_group.done_callbacks.append(self.on_group_done)
+		worker_group.error_callbacks.append(self.on_group_error)
+		self.worker_groups.append(worker_group)
+		return worker_group
+
+	def on_group_done(self, worker_group):
+		if all(not group.is_alive() for group in self.worker_groups):
+			self.finished.set()
+
+	def on_group_error(self, worker_group, error):
+		print('%s: %s, aborting' % (worker_group.name, error))
+		self.errors.append(error)
+		self.abort()
 
 	def new_service(self, service_type, name, config):
 		pipe_out, pipe_in = ServiceManager.register(service_type.Port, name)
 		service = service_type(config, pipe_out, pipe_in)
+		service.name = self.stage_name(name)
+		service.bind(ServiceManager.get(name))
 		self.services.append(service)
 		return service
 
-	def new_worker_group(self, count, worker_type, config=None):
-		worker_group = WorkerGroup(count, worker_type, config)
-		self.worker_groups.append(worker_group)
-		return worker_group
+	def new_worker_group(self, count, worker_type, config=None, **options):
+		return self.add_worker_group(WorkerGroup(count, worker_type, config, **options))
 
-	def new_source(self, count, worker_type, config=None):
-		source_group = WorkerGroup(count, worker_type, config)
-		source_group.pipe.append(None)
+	def new_process_group(self, count, worker_type, config=None, **options):
+		return self.add_worker_group(ProcessWorkerGroup(count, worker_type, config, **options))
+
+	def new_async_group(self, concurrency, worker_type, config=None, **options):
+		return self.add_worker_group(AsyncWorkerGroup(concurrency, worker_type, config, **options))
+
+	def new_source(self, count, worker_type, config=None, name=None, journal=None):
+		source_group = WorkerGroup(count, worker_type, config, name=name, journal=journal)
+		if journal is None or not source_group.pipe.written:
+			source_group.pipe.append(None)
 		source_group.set_source_empty()
-		self.worker_groups.append(source_group)
-		return source_group
+		return self.add_worker_group(source_group)
+
+	def serve(self, address, groups, sources=1, authkey=None):
+		server = RemoteServer(address, groups, sources, authkey)
+		self.servers.append(server)
+		return server
+
+	def remote_group(self, address, name, connect_timeout=30, authkey=None):
+		return RemoteGroup(address, name, connect_timeout, authkey)
+
+	def fusable(self, worker_group):
+		if type(worker_group) is not WorkerGroup or len(worker_group.worker_list) != 1 or worker_group.autoscaled() or len(worker_group.consumers) != 1:
+			return False
+		consumer = worker_group.consumers[0]
+		outputs = worker_group.worker_list[0].outputs
+		return type(consumer) is WorkerGroup \
+			and consumer in self.worker_groups \
+			and consumer.outlet is None \
+			and consumer.retry is None \
+			and consumer.source_count == 1 \
+			and len(consumer.worker_list) == 1 \
+			and not consumer.autoscaled() \
+			and type(consumer.pipe) is Pipe \
+			and len(consumer.pipes) == 1 \
+			and len(outputs) == 1 and outputs[0] is consumer.pipe
+
+	def fuse_stages(self):
+		for worker_group in self.worker_groups:
+			if not self.fusable(worker_group):
+				continue
+			worker = worker_group.worker_list[0]
+			worker.outputs = [worker_group.consumers[0].fuse()]
+
+	def poolable(self, worker_group):
+		return type(worker_group) is WorkerGroup \
+			and worker_group.outlet is None \
+			and worker_group.retry is None \
+			and worker_group.capacity == 0 \
+			and not worker_group.autoscaled() \
+			and len(worker_group.pipes) == 1 \
+			and all(type(worker).exec is SimpleWorker.exec for worker in worker_group.worker_list)
+
+	def stats(self):
+		stats = {}
+		for service in self.services:
+			stats[service.name] = service.stats()
+		for worker_group in self.worker_groups:
+			stats[worker_group.name] = worker_group.stats()
+		return stats
+
+	def export_stats(self, path, interval=10):
+		self.monitors.append(StatsExporter(self, path, interval))
+
+	def enable_profiling(self, path, interval=0.005):
+		self.monitors.append(Sampler(self, path, interval))
+
+	def stage_threads(self):
+		threads = {}
+		for service in self.services:
+			threads[service.ident] = (service.name, service.metrics)
+		for worker_group in self.worker_groups:
+			for worker in worker_group.worker_list:
+				threads[worker.ident] = (worker_group.name, worker.metrics)
+		if self.executor is not None:
+			for ident, worker in dict(self.executor.current).items():
+				if worker is not None:
+					threads[ident] = (worker.stage, worker.metrics)
+		return threads
 
 	def mainloop(self):
+		if self.fuse:
+			self.fuse_stages()
+		if self.executor is not None:
+			for worker_group in self.worker_groups:
+				if self.poolable(worker_group):
+					self.executor.add(worker_group)
 		for service in self.services:
 			if not service.running:
 				service.start()
+		for monitor in self.monitors:
+			monitor.start()
+		for server in self.servers:
+			server.start()
 		for worker_group in self.worker_groups:
 			worker_group.start()
-		while self.running:
-			if all(not group.is_alive() for group in self.worker_groups):
-				break
-			time.sleep(1)
+		if self.executor is not None:
+			self.executor.start()
+		if any(group.autoscaled() for group in self.worker_groups):
+			self.autoscaler.start()
+		if all(not group.is_alive() for group in self.worker_groups):
+			self.finished.set()
+		self.finished.wait()
+		if self.autoscaler.is_alive():
+			self.autoscaler.abort()
+			self.autoscaler.join()
 		for worker_group in self.worker_groups:
 			worker_group.abort()
 		for worker_group in self.worker_groups:
 			worker_group.join()
+		if self.executor is not None:
+			self.executor.stop()
+		for server in self.servers:
+			server.abort()
+		for server in self.servers:
+			server.join()
 		for service in self.services:
 			service.abort()
 		for service in self.services:
 			service.join()
+		shm.registry.release_all()
+		if self.running:
+			for worker_group in self.worker_groups:
+				for pipe in worker_group.pipes:
+					if isinstance(pipe, JournalPipe):
+						pipe.discard()
+		for monitor in self.monitors:
+			monitor.abort()
+		for monitor in self.monitors:
+			monitor.join()
+		if self.errors:
+			raise self.errors[0]
 
 signal.signal(signal.SIGINT, System.signal_handler)
@@ -1,4 +1,8 @@
 from ..pipeline.service import ServiceWorker
+from ..pipeline.parallel import SIGNAL_STOP
+from ..pipeline.metrics import snapshot
+from ..pipeline.cache import ResultCache
+from ..pipeline.columns import ColumnBatch
 from ..utils.tui import TextUserInterface
 from . import stock_db
 from . import analyze_db
@@ -6,6 +10,8 @@ from . import analyze_db
 import sys
 import traceback
 import math
+import queue
+import time
 from sqlalchemy import func, select, or_
 
 class DB(stock_db.Database):
@@ -32,6 +38,14 @@ class DB(stock_db.Database):
 		trades = self.fetchall('trade', attr, order_by=stock_db.Trade.date.asc(), extra=extra)
 		return [{c.name: t[i] for i, c in enumerate(self.Trade.columns)} for t in trades]
 
+	def list_invester(self, attr=dict(), extra=None):
+		trades = self.fetchall('trade', attr, order_by=stock_db.Trade.date.asc(), extra=extra)
+		return [{'date': t.date, 'hold_by_foreign_percent': t.hold_by_foreign_percent} for t in trades if t.hold_by_foreign_percent is not None]
+
+	def list_trade_columns(self, attr=dict(), extra=None):
+		trades = self.fetchall('trade', attr, order_by=stock_db.Trade.date.asc(), extra=extra)
+		return ColumnBatch.from_rows(trades, [c.name for c in self.Trade.columns])
+
 	def get_trade_max_date(self, attr=dict()):
 		if 'stock_id' in attr:
 			sql = 'SELECT coalesce(MAX(date), date("2021-01-01")) FROM trade WHERE stock_id="{}"'.format(attr['stock_id'])
@@ -88,7 +102,7 @@ class AnalyzeDB(analyze_db.Database):
 			subq
 		)
 		self.session.execute(ins)
-		self.session.commit()
+		self.commit()
 
 	def reset_tag(self, stock_id, symbol):
 		subq = self.session.query(analyze_db.Tag.tag_id).filter(analyze_db.Tag.tag==symbol).subquery()
@@ -96,7 +110,7 @@ class AnalyzeDB(analyze_db.Database):
 			(analyze_db.StockTag.stock_id==stock_id) & (analyze_db.StockTag.tag_id==subq)
 		)
 		self.session.execute(ins)
-		self.session.commit()
+		self.commit()
 
 	def list_tag(self):
 		parent_filter = or_((analyze_db.Tag.parent_tag==1), (analyze_db.Tag.parent_tag==2), (analyze_db.Tag.parent_tag==None))
@@ -126,7 +140,7 @@ class AnalyzeDB(analyze_db.Database):
 
 		ins = self.StockTag.insert().values(stock_id=stock_id, tag_id=new_tag.tag_id)
 		self.session.execute(ins)
-		self.session.commit()
+		self.commit()
 
 	def update_exclusive_tag(self, stock_id, tag, exclusive_tags, parent=None):
 		req = self.session.query(analyze_db.Tag)
@@ -144,22 +158,155 @@ class AnalyzeDB(analyze_db.Database):
 
 		ins = self.StockTag.insert().values(stock_id=stock_id, tag_id=new_tag.tag_id)
 		self.session.execute(ins)
-		self.session.commit()
+		self.commit()
 
 class DbService(ServiceWorker):
+	writes = {
+		'insert', 'delete', 'many',
+		'insert_stock', 'insert_trade', 'insert_relation',
+		'set_tag', 'reset_tag', 'update_stock_tag', 'update_exclusive_tag',
+	}
+	reads = {
+		'list_stock': ('stock',),
+		'get_trade_max_date': ('stock', 'trade'),
+		'list_last_trade': ('trade',),
+		'list_trade': ('trade',),
+		'list_trade_columns': ('trade',),
+		'list_invester': ('trade',),
+		'list_by_tag': ('tag', 'stock_tag'),
+		'list_tag_of_stock': ('tag', 'stock_tag'),
+		'list_tag': ('tag',),
+	}
+	invalidates = {
+		'insert_stock': ('stock',),
+		'get_stock': ('stock',),
+		'insert_trade': ('trade',),
+		'set_tag': ('stock_tag',),
+		'reset_tag': ('stock_tag',),
+		'update_stock_tag': ('stock_tag',),
+		'update_exclusive_tag': ('stock_tag',),
+	}
+
 	def __init__(self, config, pipe_out, pipe_in):
 		super(DbService, self).__init__(config, pipe_out, pipe_in)
+		self.group_commit = config.get('group_commit', 0)
+		self.commit_linger = config.get('commit_linger', 0.005)
+		self.cache = ResultCache(config['cache_size'], config.get('cache_ttl', 60)) if config.get('cache_size') else None
+		self.read_queue = queue.Queue()
+		self.readers = [DbReader(config, pipe_out, self.read_queue) for i in range(config.get('readers', 0))]
+		for reader in self.readers:
+			reader.cache = self.cache
+
+	def bind(self, port):
+		if self.readers:
+			port.read_port = self.read_queue
+
+	def stats(self):
+		workers = {self.name: self.metrics}
+		workers.update({reader.name: reader.metrics for reader in self.readers})
+		stats = snapshot('service', self.pipe_in.qsize() + self.read_queue.qsize(), workers)
+		if self.cache is not None:
+			stats['cache'] = self.cache.stats()
+		return stats
 
 	def on_start(self):
 		self.db = DB()
 		self.analyze_db = AnalyzeDB()
-		self.db.connect(self.config['db_path'])
-		self.analyze_db.connect(self.config['analyze_db_path'])
+		self.db.connect(self.config['db_path'], wal=bool(self.readers))
+		self.analyze_db.connect(self.config['analyze_db_path'], wal=bool(self.readers))
+		for index, reader in enumerate(self.readers):
+			reader.name = '%s-reader-%d' % (self.name, index)
+			reader.start()
 
 	def on_abort(self):
+		for reader in self.readers:
+			reader.abort()
+		for reader in self.readers:
+			reader.join()
 		self.db.conn.close()
 
+	def handle_requests(self, requests):
+		if not self.group_commit:
+			return super(DbService, self).handle_requests(requests)
+		group = []
+		while requests:
+			req = requests.pop(0)
+			if req['data'][0] in self.writes:
+				if not group:
+					deadline = time.monotonic() + self.commit_linger
+				group.append(req)
+			else:
+				self.commit_group(group)
+				group = []
+				self.handle(req)
+			if len(group) >= self.group_commit:
+				self.commit_group(group)
+				group = []
+			if group and not requests:
+				try:
+					req = self.pipe_in.get(timeout=max(0, deadline - time.monotonic()))
+				except queue.Empty:
+					break
+				if req is not SIGNAL_STOP:
+					requests.append(req)
+		self.commit_group(group)
+
+	def commit_group(self, group):
+		if not group:
+			return
+		started = time.perf_counter()
+		results = []
+		error = None
+		self.db.deferred = self.analyze_db.deferred = True
+		try:
+			for req in group:
+				results.append(self.process(req['data']))
+			self.db.session.commit()
+			self.analyze_db.session.commit()
+		except Exception as e:
+			if len(group) == 1:
+				traceback.print_exc()
+			self.db.session.rollback()
+			self.analyze_db.session.rollback()
+			error = e
+		finally:
+			self.db.deferred = self.analyze_db.deferred = False
+		if error is not None and len(group) > 1:
+			for req in group:
+				self.commit_group([req])
+			return
+		self.metrics.add_busy(len(group), time.perf_counter() - started)
+		if error is not None:
+			self.metrics.exceptions += 1
+			group[0]['reply'].set_exception(error)
+			return
+		for req in group:
+			self.invalidate(req['data'])
+		for req, result in zip(group, results):
+			req['reply'].set_result(result)
+			if not req['async']:
+				self.metrics.items_out += 1
+
 	def process(self, data):
+		if self.cache is None:
+			return self.query(data)
+		if data[0] in self.reads:
+			result = self.cache.fetch(repr(data), self.reads[data[0]], lambda: self.query(data))
+			return list(result) if isinstance(result, list) else result
+		result = self.query(data)
+		if not self.db.deferred:
+			self.invalidate(data)
+		return result
+
+	def invalidate(self, data):
+		if self.cache is None or data[0] in self.reads:
+			return
+		if data[0] in self.invalidates:
+			self.cache.invalidate(self.invalidates[data[0]])
+		elif data[0] in self.writes or not (hasattr(self.db, data[0]) or hasattr(self.analyze_db, data[0])):
+			self.cache.invalidate()
+
+	def query(self, data):
 		try:
 			if hasattr(self.db, data[0]):
 				return getattr(self.db, data[0])(*data[1:])
@@ -176,24 +323,39 @@ class DbService(ServiceWorker):
 				else:
 					self.db.execute(sql, params)
 		except Exception as e:
+			if self.db.deferred:
+				raise
 			print('DbService:', e)
 			traceback.print_exc(file=sys.stdout)
 
 	class Port(ServiceWorker.Port):
+		read_port = None
+
+		def read(self, data):
+			return self.request(data, no_wait=False, port=self.read_port)
+
 		def get_trade_max_date(self, attr={}):
-			return self.request(['get_trade_max_date', attr], no_wait=False)
+			return self.read(['get_trade_max_date', attr])
 		def get_foreign_max_date(self, attr={}):
-			return self.request(['get_foreign_max_date', attr], no_wait=False)
+			return self.read(['get_foreign_max_date', attr])
 		def insert_trade(self, attr):
 			return self.request(['insert_trade', attr], no_wait=False)
 		def insert_stock(self, attr):
 			return self.request(['insert_stock', attr], no_wait=False)
 		def list_stock(self, attr=dict()):
-			return self.request(['list_stock', attr], no_wait=False)
+			return self.read(['list_stock', attr])
 		def list_last_trade(self, attr=dict()):
-			return self.request(['list_last_trade', attr], no_wait=False)
+			return self.read(['list_last_trade', attr])
 		def list_trade(self, attr=dict(), extra=None):
-			return self.request(['list_trade', attr, extra], no_wait=False)
+			return self.read(['list_trade', attr, extra])
+		def list_trade_columns(self, attr=dict(), extra=None):
+			return self.read(['list_trade_columns', attr, extra])
+		def list_invester(self, attr=dict(), extra=None):
+			return self.read(['list_invester', attr, extra])
+		def list_by_tag(self, *ids):
+			return self.read(['list_by_tag', *ids])
+		def list_tag_of_stock(self, stock_id):
+			return self.read(['list_tag_of_stock', stock_id])
 		def get_stock(self, attr):
 			return self.request(['get_stock', attr], no_wait=False)
 		def insert_relation(self, attr):
@@ -203,6 +365,24 @@ class DbService(ServiceWorker):
 		def set_tag(self, stock_id, tag):
 			return self.request(['set_tag', stock_id, tag], no_wait=False)
 
+class DbReader(DbService):
+	pipeline_depth = 1
+
+	def __init__(self, config, pipe_out, pipe_in):
+		super(DbService, self).__init__(config, pipe_out, pipe_in)
+		self.group_commit = 0
+		self.cache = None
+		self.readers = []
+
+	def on_start(self):
+		self.db = DB()
+		self.analyze_db = AnalyzeDB()
+		self.db.connect(self.config['db_path'], readonly=True)
+		self.analyze_db.connect(self.config['analyze_db_path'], readonly=True)
+
+	def on_abort(self):
+		self.db.conn.close()
+
 class MessageService(ServiceWorker):
 	def __init__(self, config, pipe_out, pipe_in):
 		super(MessageService, self).__init__(config, pipe_out, pipe_in)
@@ -1,5 +1,6 @@
 from ..pipeline.service import ServiceManager
 from ..pipeline.system import System
+from ..pipeline.retry import RetryPolicy
 from .service import MessageService, DbService
 from .worker import CounterSingleStockFetcher, \
 					SingleStockFetcher, DateGenerator, ConsoleWriter
@@ -21,8 +22,8 @@ message_service = sys.new_service(MessageService, 'message', {})
 db_service = sys.new_service(DbService, fetcher_config['db'], db_cnofig)
 db_port = ServiceManager.get(fetcher_config['db'])
 
-stock_fetcher = sys.new_worker_group(1, SingleStockFetcher, fetcher_config)
-counter_fetcher = sys.new_worker_group(1, CounterSingleStockFetcher, fetcher_config)
+stock_fetcher = sys.new_worker_group(1, SingleStockFetcher, fetcher_config, retry=RetryPolicy(max_attempts=4, backoff=30, dead_letter='stock_fetch.dead'))
+counter_fetcher = sys.new_worker_group(1, CounterSingleStockFetcher, fetcher_config, retry=RetryPolicy(max_attempts=4, backoff=30, dead_letter='counter_fetch.dead'))
 console_writer = sys.new_worker_group(1, ConsoleWriter)
 
 stock_fetcher.send_to(console_writer)
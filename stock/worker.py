@@ -1,5 +1,6 @@
 from ..pipeline.parallel import SimpleWorker
 from ..pipeline.service import ServiceManager
+from ..pipeline.ratelimit import RateLimiter
 from .service import DB
 
 from datetime import timedelta, datetime, date as date_type
@@ -19,9 +20,15 @@ from scipy import stats
 
 
 class ConsoleWriter(SimpleWorker):
+	batch_size = 64
+	batch_linger = 0.05
+
 	def process(self, data):
 		print(data)
 
+	def process_batch(self, items):
+		print('\n'.join(str(data) for data in items))
+
 class Store:
 	def __init__(self):
 		self.history = []
@@ -167,6 +174,15 @@ def parseTrades(source, db, total_store = None):
 				continue
 	return store_map, total_store
 
+def throttledPost(worker, url):
+	if not worker.config['fetch_interval']:
+		return requests.post(url)
+	limiter = RateLimiter.get(url, rate=1 / worker.config['fetch_interval'])
+	while not limiter.acquire(timeout=1):
+		if not worker.running:
+			raise InterruptedError('aborted while waiting for ' + limiter.host)
+	return limiter.call(requests.post, url)
+
 class DateGenerator(SimpleWorker):
 	def process(self, item):
 		last_record, end_date, date_step = self.config
@@ -185,7 +201,7 @@ class SingleStockFetcher(SimpleWorker):
 	def fetchIndex(self, date):
 		datestr = date.strftime('%Y%m%d')
 		self.tui.progress('fetching trade at %s' % (datestr))
-		r = requests.post('http://www.twse.com.tw/exchangeReport/MI_INDEX?response=csv&type=ALL&date=' + datestr)
+		r = throttledPost(self, 'http://www.twse.com.tw/exchangeReport/MI_INDEX?response=csv&type=ALL&date=' + datestr)
 		self.tui.done()
 
 		if not r.text:
@@ -224,7 +240,7 @@ class SingleStockFetcher(SimpleWorker):
 
 	def fetchMargin(self, date):
 		datestr = date.strftime('%Y%m%d')	
-		r = requests.post('https://www.twse.com.tw/exchangeReport/MI_MARGN?response=csv&selectType=ALL&date=' + datestr)
+		r = throttledPost(self, 'https://www.twse.com.tw/exchangeReport/MI_MARGN?response=csv&selectType=ALL&date=' + datestr)
 
 		if not r.text:
 		    print('no data')
@@ -259,12 +275,12 @@ class SingleStockFetcher(SimpleWorker):
 	def fetchForeign(self, date):
 		datestr = date.strftime('%Y%m%d')
 		self.tui.progress('fetching foreign at %s' % (datestr))
-		r = requests.post('http://www.twse.com.tw/fund/MI_QFIIS?response=csv&selectType=ALLBUT0999&date=' + datestr)
+		r = throttledPost(self, 'http://www.twse.com.tw/fund/MI_QFIIS?response=csv&selectType=ALLBUT0999&date=' + datestr)
 		self.tui.done()
 
 		if not r.text:
 			print('no data')
-			return
+			return {}
 
 		self.tui.progress('transforming')
 		rows = [i.translate({ord(c): None for c in ' '}) for i in r.text.split('\n') if not i.startswith('="') and (i.count('",') in (11, 12))]
@@ -291,54 +307,36 @@ class SingleStockFetcher(SimpleWorker):
 		}
 
 	def process(self, date):
-		try:
-			indexMap = self.fetchIndex(date)
-			if indexMap is None:
-				return
-
-			for stockId, indexInfo in indexMap.items():
-				indexMap[stockId].update({c.name: None for c in DB.Trade.columns if c.name not in indexInfo})
-
-			for i in range(self.config["fetch_interval"]):
-				if not self.running:
-					return
-				self.tui.progress('sleeping', i, self.config["fetch_interval"])
-				time.sleep(1)
-
-			marginMap = self.fetchMargin(date)
-			for stockId, marginInfo in marginMap.items():
-				if stockId not in indexMap:
-					print('no matching stock id: {}'.format(stockId,))
-					continue
-				indexMap[stockId].update(marginInfo)
-
-			for i in range(self.config["fetch_interval"]):
-				if not self.running:
-					return
-				self.tui.progress('sleeping', i, self.config["fetch_interval"])
-				time.sleep(1)
-
-			foreignMap = self.fetchForeign(date)
-			for stockId, foreignInfo in foreignMap.items():
-				if stockId not in indexMap:
-					print('no matching stock id: {}'.format(stockId,))
-					continue
-				indexMap[stockId].update(foreignInfo)
-
-			self.tui.progress('insert trade')
-			self.db.insert_trade([info for info in indexMap.values()])
-			self.tui.done()
-
-		except Exception as e:
-			print(e)
-			# with open('%s.csv' % (datestr), 'w') as f:
-			# 	f.write(r.text)
-
-		for i in range(self.config["fetch_interval"]):
-			if not self.running:
-				return
-			self.tui.progress('sleeping', i, self.config["fetch_interval"])
-			time.sleep(1)
+		indexMap = self.fetchIndex(date)
+		if indexMap is None:
+			return
+
+		for stockId, indexInfo in indexMap.items():
+			indexMap[stockId].update({c.name: None for c in DB.Trade.columns if c.name not in indexInfo})
+
+		if not self.running:
+			raise InterruptedError('aborted while fetching %s' % (date,))
+
+		marginMap = self.fetchMargin(date)
+		for stockId, marginInfo in marginMap.items():
+			if stockId not in indexMap:
+				print('no matching stock id: {}'.format(stockId,))
+				continue
+			indexMap[stockId].update(marginInfo)
+
+		if not self.running:
+			raise InterruptedError('aborted while fetching %s' % (date,))
+
+		foreignMap = self.fetchForeign(date)
+		for stockId, foreignInfo in foreignMap.items():
+			if stockId not in indexMap:
+				print('no matching stock id: {}'.format(stockId,))
+				continue
+			indexMap[stockId].update(foreignInfo)
+
+		self.tui.progress('insert trade')
+		self.db.insert_trade([info for info in indexMap.values()])
+		self.tui.done()
 
 class CounterSingleStockFetcher(SimpleWorker):
 	def __init__(self, pipe, config):
@@ -350,7 +348,7 @@ class CounterSingleStockFetcher(SimpleWorker):
 		datestr = '/'.join('%02d' % (s,) for s in [date.year - 1911, date.month, date.day])
 		self.tui.progress('fetching counter trade at %s' % (datestr))
 		stock_re = re.compile(r'"\d{4}"')
-		r = requests.post('http://www.tpex.org.tw/web/stock/aftertrading/daily_close_quotes/stk_quote_download.php?l=zh-tw&s=0,asc,0&d=' + datestr)
+		r = throttledPost(self, 'http://www.tpex.org.tw/web/stock/aftertrading/daily_close_quotes/stk_quote_download.php?l=zh-tw&s=0,asc,0&d=' + datestr)
 		self.tui.done()
 
 		if not r.text:
@@ -403,12 +401,12 @@ class CounterSingleStockFetcher(SimpleWorker):
 		stock_re = re.compile(r'"\d+","\d{4}"')
 
 		self.tui.progress('fetching counter foreign at %s' % (datestr))
-		r = requests.post('https://www.tpex.org.tw/web/stock/3insti/qfii/qfii_result.php?l=zh-tw&s=0,asc,0&o=csv&d=' + datestr)
+		r = throttledPost(self, 'https://www.tpex.org.tw/web/stock/3insti/qfii/qfii_result.php?l=zh-tw&s=0,asc,0&o=csv&d=' + datestr)
 		self.tui.done()
 
 		if not r.text:
 			print('no data')
-			return
+			return {}
 
 		self.tui.progress('transforming')
 		rows = [i.translate({ord(c): None for c in ' '}) for i in r.text.split('\n') if stock_re.match(i) and (i.count('",') == 9)]
@@ -447,12 +445,12 @@ class CounterSingleStockFetcher(SimpleWorker):
 		stock_re = re.compile(r'"\d{4}"')
 
 		self.tui.progress('fetching counter margin at %s' % (datestr))
-		r = requests.post('https://www.tpex.org.tw/web/stock/margin_trading/margin_balance/margin_bal_result.php?l=zh-tw&o=csv&s=0,asc&d=' + datestr)
+		r = throttledPost(self, 'https://www.tpex.org.tw/web/stock/margin_trading/margin_balance/margin_bal_result.php?l=zh-tw&o=csv&s=0,asc&d=' + datestr)
 		self.tui.done()
 
 		if not r.text:
 			print('no data')
-			return
+			return {}
 
 		self.tui.progress('transforming')
 		rows = [i.translate({ord(c): None for c in ' '}) for i in r.text.split('\n') if stock_re.match(i) and i.count('",') == 19]
@@ -487,53 +485,35 @@ class CounterSingleStockFetcher(SimpleWorker):
 		for row in df.itertuples()}
 
 	def process(self, date):
-		try:
-			indexMap = self.fetchIndex(date)
-
-			if indexMap is None:
-				return
-
-			for stockId, indexInfo in indexMap.items():
-				indexMap[stockId].update({c.name: None for c in DB.Trade.columns if c.name not in indexInfo})
-
-			for i in range(self.config["fetch_interval"]):
-				if not self.running:
-					return
-				self.tui.progress('sleeping', i, self.config["fetch_interval"])
-				time.sleep(1)
-
-			foreignMap = self.fetchForeign(date)
-			for stockId, foreignInfo in foreignMap.items():
-				if stockId not in indexMap:
-					print('no matching stock id: {}'.format(stockId,))
-					continue
-				indexMap[stockId].update(foreignInfo)
-
-			for i in range(self.config["fetch_interval"]):
-				if not self.running:
-					return
-				self.tui.progress('sleeping', i, self.config["fetch_interval"])
-				time.sleep(1)
-
-			marginMap = self.fetchMargin(date)
-			for stockId, marginInfo in marginMap.items():
-				if stockId not in indexMap:
-					print('no matching stock id: {}'.format(stockId,))
-					continue
-				indexMap[stockId].update(marginInfo)
-
-			self.db.insert_trade([info for info in indexMap.values()])
-		except Exception as e:
-			print(e)
-			# df.to_csv('%s.csv' % (datestr))
-			# with open('%s.csv' % (datestr), 'w') as f:
-			# 	f.write(r.text)
-
-		for i in range(self.config["fetch_interval"]):
-			if not self.running:
-				return
-			self.tui.progress('sleeping', i, self.config["fetch_interval"])
-			time.sleep(1)
+		indexMap = self.fetchIndex(date)
+
+		if indexMap is None:
+			return
+
+		for stockId, indexInfo in indexMap.items():
+			indexMap[stockId].update({c.name: None for c in DB.Trade.columns if c.name not in indexInfo})
+
+		if not self.running:
+			raise InterruptedError('aborted while fetching %s' % (date,))
+
+		foreignMap = self.fetchForeign(date)
+		for stockId, foreignInfo in foreignMap.items():
+			if stockId not in indexMap:
+				print('no matching stock id: {}'.format(stockId,))
+				continue
+			indexMap[stockId].update(foreignInfo)
+
+		if not self.running:
+			raise InterruptedError('aborted while fetching %s' % (date,))
+
+		marginMap = self.fetchMargin(date)
+		for stockId, marginInfo in marginMap.items():
+			if stockId not in indexMap:
+				print('no matching stock id: {}'.format(stockId,))
+				continue
+			indexMap[stockId].update(marginInfo)
+
+		self.db.insert_trade([info for info in indexMap.values()])
 
 class StockEnumerator(SimpleWorker):
 	def process(self, dummy):
@@ -558,40 +538,31 @@ class TradeLoader(SimpleWorker):
 		stock_id = data['id']
 		date_filter = data['date_filter']
 		message.progress(stock_id)
-		trades = db.list_trade({'stock_id': stock_id}, extra=date_filter)
-
-		if trades:
-			investers = db.list_invester({'stock_id': stock_id}, date_filter)
-			valid_trades = [{
-					'date': trade['date'],
-					'open_price': trade['open_price'],
-					'close_price': trade['close_price'],
-					'lowest_price': trade['lowest_price'],
-					'highest_price': trade['highest_price'],
-				} for trade in trades if trade['close_price'] is not None]
-
-			if valid_trades:
+		pending_trades = db.futures.list_trade_columns({'stock_id': stock_id}, extra=date_filter)
+		pending_investers = db.futures.list_invester({'stock_id': stock_id}, date_filter)
+		trades = pending_trades.result()
+
+		if len(trades):
+			valid_trades = trades[trades.valid('close_price')][['date', 'open_price', 'close_price', 'lowest_price', 'highest_price']]
+
+			if len(valid_trades):
 				self.output({
 					'id': stock_id,
 					'name': data['name'],
 					'group': data['group'],
 					'trades': valid_trades,
-					'investers': investers,
+					'investers': pending_investers.result(),
 				})
 		message.done()
 
 def multiMovingAverage(items, periods):
 	max_period = max(periods)
-	period_count = len(periods)
-	cumsum = [0]
-	moving_aves = [[] for _ in range(period_count)]
-	for i, x in enumerate(items, 1):
-		cumsum.append(cumsum[i-1] + x)
-		if i>=max_period:
-			for j, period in enumerate(periods):
-				moving_ave = (cumsum[i] - cumsum[i-period])/period
-				moving_aves[j].append(moving_ave)
-	return moving_aves
+	cumsum = numpy.concatenate(([0], numpy.cumsum(items)))
+	return [(cumsum[max_period:] - cumsum[max_period - period:len(cumsum) - period]) / period for period in periods]
+
+def timestamps(dates):
+	seconds = (dates - dates[0]) / numpy.timedelta64(1, 's')
+	return seconds + datetime.timestamp(datetime.combine(dates[0].item(), datetime.min.time()))
 
 class TrendTagUpdater(SimpleWorker):
 	def process(self, data):
@@ -601,19 +572,17 @@ class TrendTagUpdater(SimpleWorker):
 		stock_id = data['id']
 		date_filter = data['date_filter']
 		message.progress(stock_id)
-		trades = db.list_trade({'stock_id': stock_id}, extra=date_filter)
-		if not trades:
+		trades = db.list_trade_columns({'stock_id': stock_id}, extra=date_filter)
+		if not len(trades):
 			return
 
-		dates = [datetime.timestamp(datetime.combine(trade['date'], datetime.min.time())) for trade in trades if trade['close_price'] is not None]
-		prices = [trade['close_price'] for trade in trades if trade['close_price'] is not None]
+		trades = trades[trades.valid('close_price')]
+		dates = timestamps(trades['date'])
+		prices = trades['close_price']
 		p1, p3 = multiMovingAverage(prices, [7, 21])
 
 		fit_length = 7
-		date_offset_diff = len(prices) - fit_length
-		p1_offset = len(p1) - fit_length
-		prices_offset = len(prices) - fit_length
-		p1a, p1b = numpy.ma.polyfit([dates[-1] - d for d in dates[date_offset_diff:]], [p1[i + p1_offset] - prices[i + prices_offset] for i in range(fit_length)], 1)
+		p1a, p1b = numpy.ma.polyfit(dates[-1] - dates[-fit_length:], p1[-fit_length:] - prices[-fit_length:], 1)
 		
 		tags = ['n4', 'n2', 'p0', 'p2', 'p4', 'p6', 'p8', 'p10']
 		tag = 'p0'
@@ -670,18 +639,17 @@ class AppCacheWriter(SimpleWorker):
 			transactions.extend(self.trades_map[stock_id].history)
 
 		cache_path = os.path.join('stock/cache', stock_id)
-		last_date = max([trade['date'] for trade in trades])
 		with open(cache_path, 'w') as f:
 			json.dump({
-				'date': datetime.strftime(last_date, '%Y-%m-%d'),
+				'date': numpy.datetime_as_string(trades['date'].max(), unit='D'),
 				'name': data['name'],
 				'group': data['group'],
 				'data': {
-					'date': [datetime.strftime(trade['date'], '%Y-%m-%d') for trade in trades],
-					'open': [trade['open_price'] for trade in trades],
-					'close': [trade['close_price'] for trade in trades],
-					'low': [trade['lowest_price'] for trade in trades],
-					'high': [trade['highest_price'] for trade in trades],
+					'date': numpy.datetime_as_string(trades['date'], unit='D').tolist(),
+					'open': trades.tolist('open_price'),
+					'close': trades.tolist('close_price'),
+					'low': trades.tolist('lowest_price'),
+					'high': trades.tolist('highest_price'),
 				},
 				'trades': transactions,
 				'invester': {
@@ -696,17 +664,17 @@ class AmountFilter(SimpleWorker):
 		k = v['id']
 		now = datetime.today()
 
-		r = db.list_trade({'stock_id': k})
-		trade_list = [trade for trade in r if trade['close_price'] is not None]
+		r = db.list_trade_columns({'stock_id': k})
+		trade_list = r[r.valid('close_price')]
 
 		if len(trade_list) < 30:
 			return
 
-		if (now - datetime.combine(trade_list[-1]['date'], datetime.min.time())).total_seconds() > 30 * 24 * 60 * 60:
+		if (now - datetime.combine(trade_list['date'][-1].item(), datetime.min.time())).total_seconds() > 30 * 24 * 60 * 60:
 			return
 
-		x = [datetime.timestamp(datetime.combine(trade['date'], datetime.min.time())) for trade in trade_list]
-		y = [trade['close_price'] for trade in trade_list]
+		x = timestamps(trade_list['date'])
+		y = trade_list['close_price']
 		la, lb = numpy.ma.polyfit(x, y, 1)
 		# if la <= 0:
 		# 	return
@@ -716,7 +684,7 @@ class AmountFilter(SimpleWorker):
 			foreign_coef = 0.0
 		else:
 			foreign = [0] * len(x)
-			date_map = {trade['date']: idx for idx, trade in enumerate(trade_list)}
+			date_map = {date: idx for idx, date in enumerate(trade_list['date'].tolist())}
 			for i in history:
 				if i['date'] in date_map:
 					foreign[date_map[i['date']]] = i['hold_by_foreign_percent']
@@ -0,0 +1,39 @@
+import os
+import sys
+import threading
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if 'tasq' not in sys.modules:
+	package = types.ModuleType('tasq')
+	package.__path__ = [ROOT]
+	sys.modules['tasq'] = package
+
+from tasq.pipeline.parallel import SimpleWorker
+
+
+class Numbers(SimpleWorker):
+	def process(self, data):
+		items = self.config
+		if isinstance(items, int):
+			items = range(items)
+		for item in items:
+			self.output(item)
+
+class Collector(SimpleWorker):
+	lock = threading.Lock()
+	items = []
+	workers = {}
+
+	def process(self, data):
+		with self.lock:
+			self.items.append(data)
+			self.workers.setdefault(self.name, []).append(data)
+
+@pytest.fixture(autouse=True)
+def reset_collector():
+	Collector.items = []
+	Collector.workers = {}
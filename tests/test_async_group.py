@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+
+from tasq.pipeline.system import System
+from tasq.pipeline.parallel import AsyncWorker
+from tasq.pipeline.retry import RetryPolicy
+
+from conftest import Numbers
+
+
+class AsyncCollector(AsyncWorker):
+	items = []
+
+	async def process(self, data):
+		await asyncio.sleep(0.001)
+		self.items.append(data)
+
+@pytest.mark.parametrize('option', [
+	{'retry': RetryPolicy()},
+	{'journal': 'unused'},
+	{'max_count': 4},
+])
+def test_unsupported_options_raise(option):
+	with pytest.raises(ValueError):
+		System().new_async_group(10, AsyncCollector, **option)
+
+def test_async_group_receives_items():
+	AsyncCollector.items = []
+	system = System()
+	collector = system.new_async_group(5, AsyncCollector)
+	system.new_source(1, Numbers, 20).send_to(collector)
+	system.mainloop()
+	assert sorted(AsyncCollector.items) == list(range(20))
@@ -0,0 +1,31 @@
+import time
+
+from tasq.pipeline.system import System
+from tasq.pipeline.parallel import SimpleWorker
+
+from conftest import Numbers, Collector
+
+
+class Slow(SimpleWorker):
+	def process(self, data):
+		time.sleep(0.02)
+		self.output(data)
+
+def test_group_grows_after_its_source_has_finished():
+	system = System()
+	system.autoscaler.interval = 0.2
+	slow = system.new_worker_group(1, Slow, max_count=8)
+	system.new_source(1, Numbers, 300).send_to(slow).send_to(system.new_worker_group(1, Collector))
+	system.mainloop()
+	assert slow.stopping
+	assert len(slow.worker_list) > 1
+	assert sorted(Collector.items) == list(range(300))
+	assert all(not worker.is_alive() for worker in slow.worker_list)
+
+def test_scale_up_is_bounded_by_max_count():
+	system = System()
+	slow = system.new_worker_group(1, Slow, max_count=3)
+	assert slow.scale_up() is not None
+	assert slow.scale_up() is not None
+	assert slow.scale_up() is None
+	assert len(slow.worker_list) == 3
@@ -0,0 +1,60 @@
+import time
+
+from tasq.pipeline.system import System, WorkerGroup
+from tasq.pipeline.parallel import SimpleWorker, SIGNAL_STOP
+
+from conftest import Numbers, Collector
+
+
+class Batcher(SimpleWorker):
+	batch_size = 10
+	sizes = []
+
+	def process_batch(self, items):
+		self.sizes.append(len(items))
+		for data in items:
+			self.output(data)
+
+class Lingering(Batcher):
+	batch_size = 20
+	batch_linger = 0.5
+
+class Trickle(SimpleWorker):
+	def process(self, data):
+		for i in range(20):
+			self.output(i)
+			time.sleep(0.005)
+
+class Picky(SimpleWorker):
+	batch_size = 8
+
+	def process(self, data):
+		if data == 3:
+			raise ValueError('bad item')
+		self.output(data)
+
+def test_queued_items_are_taken_in_batches():
+	Batcher.sizes = []
+	group = WorkerGroup(1, Batcher)
+	for i in range(25):
+		group.pipe.append(i)
+	group.pipe.append(SIGNAL_STOP)
+	group.start()
+	group.join()
+	assert Batcher.sizes == [10, 10, 5]
+
+def test_batches_wait_for_batch_linger():
+	Lingering.sizes = []
+	system = System()
+	lingering = system.new_worker_group(1, Lingering)
+	system.new_source(1, Trickle).send_to(lingering).send_to(system.new_worker_group(1, Collector))
+	system.mainloop()
+	assert sorted(Collector.items) == list(range(20))
+	assert max(Lingering.sizes) > 1
+
+def test_default_process_batch_isolates_failing_items():
+	system = System()
+	picky = system.new_worker_group(2, Picky)
+	system.new_source(1, Numbers, 50).send_to(picky).send_to(system.new_worker_group(1, Collector))
+	system.mainloop()
+	assert sorted(Collector.items) == [i for i in range(50) if i != 3]
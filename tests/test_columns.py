@@ -0,0 +1,34 @@
+from datetime import date
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+from tasq.pipeline.columns import ColumnBatch, to_array
+
+
+def test_numbers_with_missing_values_become_float():
+	array = to_array([1, None, 3])
+	assert array.dtype == float
+	assert numpy.isnan(array[1])
+
+def test_strings_with_missing_values_stay_strings():
+	array = to_array(['1', None, '3'])
+	assert array.dtype == object
+	assert array.tolist() == ['1', None, '3']
+
+def test_records_round_trip():
+	records = [
+		{'date': date(2021, 1, 4), 'close_price': 10.5, 'ud': '+'},
+		{'date': date(2021, 1, 5), 'close_price': None, 'ud': None},
+	]
+	batch = ColumnBatch.from_records(records)
+	assert batch['date'].dtype.kind == 'M'
+	assert batch.records() == records
+
+def test_selection():
+	batch = ColumnBatch.from_rows([(1, 2.0), (2, None), (3, 4.0)], ['id', 'price'])
+	valid = batch[batch.valid('price')]
+	assert valid.tolist('id') == [1, 3]
+	assert batch[['price']].fields() == ['price']
+	assert len(batch[1:]) == 2
@@ -0,0 +1,67 @@
+from datetime import date
+
+import pytest
+
+service = pytest.importorskip('tasq.stock.service')
+
+from tasq.pipeline.system import System
+from tasq.pipeline.service import ServiceManager
+
+
+def start(tmp_path, name, **config):
+	config.update(db_path=str(tmp_path / 'stock.db'), analyze_db_path=str(tmp_path / 'analyze.db'))
+	db_service = System().new_service(service.DbService, name, config)
+	db_service.start()
+	return db_service, ServiceManager.get(name)
+
+def stop(db_service):
+	db_service.abort()
+	db_service.join()
+
+def test_failing_write_in_a_group_fails_only_its_caller(tmp_path):
+	db_service, port = start(tmp_path, 'db-group', group_commit=64, commit_linger=0.05)
+	try:
+		first = [port.futures.insert_stock({'id': str(i), 'name': 'n%d' % i, 'level_id': 1}) for i in range(5)]
+		failing = port.futures.insert_trade({'stock_id': '0', 'date': 'not a date'})
+		second = [port.futures.insert_stock({'id': str(i), 'name': 'n%d' % i, 'level_id': 1}) for i in range(5, 10)]
+		with pytest.raises(Exception):
+			failing.result(10)
+		assert [future.result(10)[0] for future in first + second] == [str(i) for i in range(10)]
+		assert len(port.list_stock()) == 10
+		assert port.insert_trade({'stock_id': '0', 'date': date(2021, 1, 4)}) is not None
+	finally:
+		stop(db_service)
+
+def test_readers_see_committed_writes(tmp_path):
+	db_service, port = start(tmp_path, 'db-readers', readers=2, group_commit=16)
+	try:
+		for i in range(5):
+			port.insert_stock({'id': str(i), 'name': 'n%d' % i, 'level_id': 1})
+			assert len(port.list_stock()) == i + 1
+		assert port.read_port is db_service.read_queue
+	finally:
+		stop(db_service)
+
+def test_reads_are_spread_across_readers(tmp_path):
+	db_service, port = start(tmp_path, 'db-spread', readers=4)
+	try:
+		for i in range(200):
+			port.insert_stock({'id': str(i), 'name': 'n%d' % i, 'level_id': 1})
+		futures = [port.futures.list_stock() for _ in range(40)]
+		assert all(len(future.result(10)) == 200 for future in futures)
+		reads = [reader.metrics.items_in for reader in db_service.readers]
+		assert len([count for count in reads if count]) > 1
+	finally:
+		stop(db_service)
+
+def test_cache_is_invalidated_by_writes(tmp_path):
+	db_service, port = start(tmp_path, 'db-cache', cache_size=8)
+	try:
+		assert port.list_stock() == []
+		assert port.list_stock() == []
+		port.insert_stock({'id': '1', 'name': 'a', 'level_id': 1})
+		assert len(port.list_stock()) == 1
+		cache = db_service.stats()['cache']
+		assert (cache['hits'], cache['misses']) == (1, 2)
+	finally:
+		stop(db_service)
@@ -0,0 +1,96 @@
+import threading
+import time
+
+from tasq.pipeline.system import System
+from tasq.pipeline.parallel import SimpleWorker
+
+from conftest import Numbers, Collector
+
+
+class Increment(SimpleWorker):
+	def process(self, data):
+		self.output(data + 1)
+
+class Spinner(SimpleWorker):
+	lock = threading.Lock()
+	aborted = []
+	exited = []
+
+	def process(self, data):
+		while self.running:
+			time.sleep(0.01)
+
+	def on_abort(self):
+		with self.lock:
+			self.aborted.append(self.name)
+
+def test_pooled_pipeline_delivers_every_item():
+	system = System(pool=2)
+	increment = system.new_worker_group(3, Increment)
+	collector = system.new_worker_group(1, Collector)
+	system.new_source(1, Numbers, 500).send_to(increment).send_to(collector)
+	system.mainloop()
+	assert increment.executor is not None
+	assert sorted(Collector.items) == list(range(1, 501))
+
+def test_abort_stops_pooled_workers():
+	Spinner.aborted = []
+	Spinner.exited = []
+	system = System(pool=2)
+	spinner = system.new_worker_group(2, Spinner)
+	for worker in spinner.worker_list:
+		worker.exit_callbacks.append(lambda worker: Spinner.exited.append(worker.name))
+	system.new_source(1, Numbers, 1).send_to(spinner)
+	thread = threading.Thread(target=system.mainloop, daemon=True)
+	thread.start()
+	time.sleep(0.3)
+	started = time.monotonic()
+	system.abort()
+	thread.join(5)
+	assert not thread.is_alive()
+	assert time.monotonic() - started < 2
+	assert spinner.executor is not None
+	assert sorted(Spinner.aborted) == sorted(worker.name for worker in spinner.worker_list)
+	assert sorted(Spinner.exited) == sorted(worker.name for worker in spinner.worker_list)
+
+class Trickle(SimpleWorker):
+	def process(self, data):
+		for i in range(20):
+			self.output(i)
+			time.sleep(0.005)
+
+class Batcher(SimpleWorker):
+	batch_size = 20
+	batch_linger = 0.5
+	sizes = []
+
+	def process_batch(self, items):
+		self.sizes.append(len(items))
+
+class Spin(SimpleWorker):
+	def process(self, data):
+		deadline = time.monotonic() + 0.1
+		while time.monotonic() < deadline:
+			pass
+
+def test_pooled_batches_wait_for_batch_linger():
+	Batcher.sizes = []
+	system = System(pool=2)
+	batcher = system.new_worker_group(1, Batcher)
+	system.new_source(1, Trickle).send_to(batcher)
+	system.mainloop()
+	assert batcher.executor is not None
+	assert sum(Batcher.sizes) == 20
+	assert max(Batcher.sizes) > 1
+
+def test_profiler_samples_pooled_workers(tmp_path):
+	path = str(tmp_path / 'profile.txt')
+	system = System(pool=1)
+	spin = system.new_worker_group(1, Spin)
+	system.new_source(1, Numbers, 3).send_to(spin)
+	system.enable_profiling(path, interval=0.005)
+	system.mainloop()
+	assert spin.executor is not None
+	with open(path) as f:
+		stages = [line.split(';')[0] for line in f]
+	assert 'Spin' in stages
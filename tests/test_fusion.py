@@ -0,0 +1,54 @@
+import threading
+
+from tasq.pipeline.system import System
+from tasq.pipeline.parallel import SimpleWorker
+
+from conftest import Numbers, Collector
+
+
+class Increment(SimpleWorker):
+	threads = set()
+	events = []
+
+	def on_start(self):
+		self.events.append('start')
+
+	def process(self, data):
+		self.threads.add(threading.get_ident())
+		self.output(data + 1)
+
+	def on_abort(self):
+		self.events.append('abort')
+
+def run(fuse, collectors=1):
+	Increment.threads = set()
+	Increment.events = []
+	system = System(fuse=fuse)
+	increment = system.new_worker_group(1, Increment)
+	collector = system.new_worker_group(collectors, Collector)
+	source = system.new_source(1, Numbers, 50)
+	source.send_to(increment).send_to(collector)
+	system.mainloop()
+	return source, increment, collector
+
+def test_linear_chain_runs_in_the_source_thread():
+	source, increment, collector = run(fuse=True)
+	assert increment.outlet is not None
+	assert collector.outlet is not None
+	assert Increment.threads == {source.worker_list[0].ident}
+	assert Increment.events == ['start', 'abort']
+	assert Collector.items == list(range(1, 51))
+	assert increment.stats()['items_in'] == 50
+	assert not increment.is_alive() and not collector.is_alive()
+
+def test_group_with_several_workers_is_not_fused():
+	source, increment, collector = run(fuse=True, collectors=2)
+	assert increment.outlet is not None
+	assert collector.outlet is None
+	assert sorted(Collector.items) == list(range(1, 51))
+
+def test_stages_are_not_fused_by_default():
+	source, increment, collector = run(fuse=False)
+	assert increment.outlet is None
+	assert Increment.threads == {increment.worker_list[0].ident}
+	assert Collector.items == list(range(1, 51))
@@ -0,0 +1,62 @@
+import os
+
+from tasq.pipeline.system import System
+from tasq.pipeline.journal import JournalPipe
+
+from conftest import Numbers, Collector
+
+
+def test_unacknowledged_items_are_replayed(tmp_path):
+	path = str(tmp_path / 'stage')
+	pipe = JournalPipe(path)
+	for item in ('a', 'b', 'c'):
+		pipe.append(item)
+	assert pipe.popleft(0) == 'a'
+	pipe.ack()
+	assert pipe.popleft(0) == 'b'
+	pipe.log.close()
+
+	replayed = JournalPipe(path)
+	assert [replayed.popleft(0) for _ in range(len(replayed))] == ['b', 'c']
+	replayed.log.close()
+
+def test_torn_record_is_dropped(tmp_path):
+	path = str(tmp_path / 'stage')
+	pipe = JournalPipe(path)
+	pipe.append('whole')
+	pipe.log.close()
+	with open(path, 'ab') as f:
+		f.write(b'\x40\x00\x00\x00partial')
+
+	replayed = JournalPipe(path)
+	assert [replayed.popleft(0) for _ in range(len(replayed))] == ['whole']
+	replayed.append('next')
+	replayed.log.close()
+	assert [entry.item for entry in JournalPipe(path).items] == ['whole', 'next']
+
+def test_run_resumes_left_over_items_and_removes_journals(tmp_path):
+	path = str(tmp_path / 'collector')
+	left_over = JournalPipe(path)
+	left_over.append(100)
+	left_over.append(101)
+	left_over.log.close()
+
+	system = System()
+	collector = system.new_worker_group(1, Collector, journal=path)
+	system.new_source(1, Numbers, 3).send_to(collector)
+	system.mainloop()
+	assert sorted(Collector.items) == [0, 1, 2, 100, 101]
+	assert not os.path.exists(path)
+	assert not os.path.exists(path + '.ack')
+
+def test_aborted_run_keeps_unfinished_items(tmp_path):
+	path = str(tmp_path / 'collector')
+	system = System()
+	collector = system.new_worker_group(1, Collector, journal=path)
+	for item in range(5):
+		collector.pipe.append(item)
+	system.abort()
+	system.mainloop()
+	assert os.path.exists(path)
+	replayed = [entry.item for entry in JournalPipe(path).items]
+	assert set(Collector.items) | set(replayed) == set(range(5))
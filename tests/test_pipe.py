@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from tasq.pipeline.system import System
+from tasq.pipeline.parallel import SimpleWorker
+from tasq.pipeline.pipe import Pipe
+
+from conftest import Numbers, Collector
+
+
+class Increment(SimpleWorker):
+	def process(self, data):
+		self.output(data + 1)
+
+def test_popleft_wakes_as_soon_as_an_item_arrives():
+	pipe = Pipe()
+	received = []
+	thread = threading.Thread(target=lambda: received.append((pipe.popleft(5), time.monotonic())))
+	thread.start()
+	time.sleep(0.05)
+	sent = time.monotonic()
+	pipe.append('item')
+	thread.join(5)
+	item, arrived = received[0]
+	assert item == 'item'
+	assert arrived - sent < 0.2
+
+def test_popleft_times_out_on_an_empty_pipe():
+	started = time.monotonic()
+	with pytest.raises(IndexError):
+		Pipe().popleft(0.05)
+	assert time.monotonic() - started >= 0.05
+
+def test_idle_stages_do_not_delay_shutdown():
+	system = System()
+	first = system.new_worker_group(2, Increment)
+	second = system.new_worker_group(2, Increment)
+	system.new_source(1, Numbers, 100).send_to(first).send_to(second).send_to(system.new_worker_group(2, Collector))
+	started = time.monotonic()
+	system.mainloop()
+	assert time.monotonic() - started < 0.5
+	assert sorted(Collector.items) == list(range(2, 102))
+
+class Slow(SimpleWorker):
+	lock = threading.Lock()
+	depths = []
+
+	def process(self, data):
+		with self.lock:
+			self.depths.append(len(self.input))
+		time.sleep(0.002)
+
+def test_append_blocks_while_the_pipe_is_full():
+	pipe = Pipe(2)
+	pipe.append(1)
+	pipe.append(2)
+	assert pipe.is_full()
+	thread = threading.Thread(target=pipe.append, args=(3,))
+	thread.start()
+	thread.join(0.1)
+	assert thread.is_alive()
+	assert pipe.popleft(0) == 1
+	thread.join(5)
+	assert not thread.is_alive()
+	assert [pipe.popleft(0), pipe.popleft(0)] == [2, 3]
+
+def test_close_releases_blocked_producers():
+	pipe = Pipe(1)
+	pipe.append(1)
+	thread = threading.Thread(target=pipe.append, args=(2,))
+	thread.start()
+	pipe.close()
+	thread.join(5)
+	assert not thread.is_alive()
+
+def test_bounded_group_holds_back_its_producer():
+	Slow.depths = []
+	system = System()
+	slow = system.new_worker_group(1, Slow, capacity=4)
+	system.new_source(1, Numbers, 100).send_to(slow)
+	system.mainloop()
+	assert len(Slow.depths) == 100
+	assert max(Slow.depths) <= 4
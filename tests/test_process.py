@@ -0,0 +1,135 @@
+import os
+import queue
+import threading
+
+import pytest
+
+from tasq.pipeline.system import System
+from tasq.pipeline.parallel import SimpleWorker
+from tasq.pipeline.service import ServiceWorker, ServiceManager
+
+from conftest import Numbers, Collector
+
+
+class UnpicklableError(Exception):
+	def __init__(self):
+		super(UnpicklableError, self).__init__('unpicklable')
+		self.lock = threading.Lock()
+
+class EchoService(ServiceWorker):
+	def process(self, data):
+		if data == 'unpicklable':
+			raise UnpicklableError()
+		if data == 'fail':
+			raise ValueError('service failed')
+		return data * 2
+
+	class Port(ServiceWorker.Port):
+		def echo(self, data):
+			return self.request(data, no_wait=False)
+
+class Caller(SimpleWorker):
+	def process(self, data):
+		try:
+			self.output(('ok', ServiceManager.get('process-echo').echo(data)))
+		except Exception as e:
+			self.output(('error', '%s: %s' % (type(e).__name__, e)))
+
+class StartCaller(SimpleWorker):
+	def on_start(self):
+		self.offset = ServiceManager.get('process-echo').echo(50)
+
+	def process(self, data):
+		self.output(data + self.offset)
+
+class Dying(SimpleWorker):
+	def process(self, data):
+		if data == 'die':
+			os._exit(3)
+		self.output(data)
+
+def run(items, worker_type=Caller):
+	system = System()
+	service = system.new_service(EchoService, 'process-echo', {})
+	service.start()
+	caller = system.new_process_group(2, worker_type, start_method='fork')
+	system.new_source(1, Numbers, items).send_to(caller).send_to(system.new_worker_group(1, Collector))
+	errors = []
+	thread = threading.Thread(target=lambda: run_mainloop(system, errors), daemon=True)
+	thread.start()
+	thread.join(30)
+	if thread.is_alive():
+		system.abort()
+		pytest.fail('mainloop did not finish')
+	if errors:
+		raise errors[0]
+	return Collector.items
+
+def run_mainloop(system, errors):
+	try:
+		system.mainloop()
+	except Exception as e:
+		errors.append(e)
+
+def test_replies_reach_the_requesting_process():
+	assert sorted(run([1, 2, 3, 4])) == [('ok', 2), ('ok', 4), ('ok', 6), ('ok', 8)]
+
+def test_service_errors_are_raised_in_the_worker_process():
+	assert run(['fail']) == [('error', 'ValueError: service failed')]
+
+def test_unpicklable_errors_do_not_hang_the_worker_process():
+	[(kind, message)] = run(['unpicklable'])
+	assert kind == 'error'
+	assert message.startswith('RuntimeError: could not return UnpicklableError')
+
+def test_on_start_can_use_services():
+	assert sorted(run(list(range(20)), StartCaller)) == list(range(100, 120))
+
+def test_dead_worker_process_fails_the_run():
+	with pytest.raises(ChildProcessError, match='exited with code 3'):
+		run([1, 'die'] + list(range(200)), Dying)
+
+class Reader(ServiceWorker):
+	def process(self, data):
+		return ('reader', data)
+
+class ReadService(ServiceWorker):
+	def __init__(self, config, pipe_out, pipe_in):
+		super(ReadService, self).__init__(config, pipe_out, pipe_in)
+		self.read_queue = queue.Queue()
+		self.reader = Reader(config, pipe_out, self.read_queue)
+
+	def bind(self, port):
+		port.read_port = self.read_queue
+
+	def on_start(self):
+		self.reader.start()
+
+	def on_abort(self):
+		self.reader.abort()
+		self.reader.join()
+
+	def process(self, data):
+		return ('writer', data)
+
+	class Port(ServiceWorker.Port):
+		read_port = None
+
+		def lookup(self, data):
+			return self.request(data, no_wait=False, port=self.read_port)
+
+		def store(self, data):
+			return self.request(data, no_wait=False)
+
+class ReadCaller(SimpleWorker):
+	def process(self, data):
+		port = ServiceManager.get('process-read')
+		self.output((port.lookup(data), port.store(data)))
+
+def test_reads_from_worker_processes_use_the_read_port():
+	system = System()
+	system.new_service(ReadService, 'process-read', {}).start()
+	caller = system.new_process_group(1, ReadCaller, start_method='fork')
+	system.new_source(1, Numbers, [1]).send_to(caller).send_to(system.new_worker_group(1, Collector))
+	system.mainloop()
+	assert Collector.items == [(('reader', 1), ('writer', 1))]
@@ -0,0 +1,41 @@
+import time
+
+import pytest
+
+from tasq.pipeline.ratelimit import RateLimiter
+
+
+def test_rate_does_not_exceed_configured_rate_by_default():
+	limiter = RateLimiter('example.com', rate=2.0)
+	for _ in range(50):
+		limiter.report(0.01, ok=True)
+	assert limiter.rate == 2.0
+
+def test_errors_back_off_and_recover_up_to_max_rate():
+	limiter = RateLimiter('example.com', rate=2.0, increase=0.5)
+	limiter.report(0.01, ok=False)
+	assert limiter.rate == 1.0
+	for _ in range(10):
+		limiter.report(0.01, ok=True)
+	assert limiter.rate == 2.0
+
+def test_max_rate_opts_in_to_speeding_up():
+	limiter = RateLimiter('example.com', rate=2.0, max_rate=4.0, increase=0.5)
+	for _ in range(10):
+		limiter.report(0.01, ok=True)
+	assert limiter.rate == 4.0
+
+def test_acquire_paces_requests():
+	limiter = RateLimiter('example.com', rate=20.0)
+	started = time.monotonic()
+	for _ in range(5):
+		assert limiter.acquire(timeout=1)
+	assert time.monotonic() - started >= 0.15
+
+def test_zero_fetch_interval_skips_the_limiter(monkeypatch):
+	worker_module = pytest.importorskip('tasq.stock.worker')
+	posted = []
+	monkeypatch.setattr(worker_module.requests, 'post', lambda url: posted.append(url) or 'response')
+	worker = worker_module.SimpleWorker(None, {'fetch_interval': 0})
+	assert worker_module.throttledPost(worker, 'http://example.com/a') == 'response'
+	assert posted == ['http://example.com/a']
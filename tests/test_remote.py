@@ -0,0 +1,96 @@
+import multiprocessing
+import os
+import pickle
+import socket
+import struct
+import threading
+
+import pytest
+from multiprocessing.connection import Client, AuthenticationError
+
+from tasq.pipeline.system import System
+
+from conftest import Numbers, Collector
+
+
+AUTHKEY = b'test-secret'
+
+class Payload:
+	def __init__(self, path):
+		self.path = path
+
+	def __reduce__(self):
+		return (os.mkdir, (self.path,))
+
+def run_in_thread(system):
+	thread = threading.Thread(target=system.mainloop, daemon=True)
+	thread.start()
+	return thread
+
+def finish(system, thread, timeout=20):
+	thread.join(timeout)
+	if thread.is_alive():
+		system.abort()
+		thread.join(5)
+		pytest.fail('mainloop did not finish')
+
+def send_numbers(address, count):
+	system = System()
+	system.new_source(1, Numbers, count).send_to(system.remote_group(address, 'collector', authkey=AUTHKEY))
+	system.mainloop()
+
+def serve_collector(address, sources):
+	system = System()
+	collector = system.new_worker_group(2, Collector)
+	system.serve(address, {'collector': collector}, sources=sources, authkey=AUTHKEY)
+	return system
+
+def test_items_cross_processes(tmp_path):
+	address = str(tmp_path / 'collector.sock')
+	system = serve_collector(address, sources=2)
+	thread = run_in_thread(system)
+	context = multiprocessing.get_context('fork')
+	senders = [context.Process(target=send_numbers, args=(address, 50)) for _ in range(2)]
+	for sender in senders:
+		sender.start()
+	for sender in senders:
+		sender.join(20)
+		assert sender.exitcode == 0
+	finish(system, thread)
+	assert sorted(Collector.items) == sorted(list(range(50)) * 2)
+
+def test_dropped_sender_counts_as_end_of_stream(tmp_path):
+	address = str(tmp_path / 'collector.sock')
+	system = serve_collector(address, sources=1)
+	thread = run_in_thread(system)
+	conn = Client(address, authkey=AUTHKEY)
+	conn.send(('hello', 'collector'))
+	conn.send(('item', 'before drop'))
+	conn.close()
+	finish(system, thread)
+	assert Collector.items == ['before drop']
+
+def test_wrong_authkey_is_rejected(tmp_path):
+	address = str(tmp_path / 'collector.sock')
+	system = serve_collector(address, sources=1)
+	thread = run_in_thread(system)
+	with pytest.raises(AuthenticationError):
+		Client(address, authkey=b'wrong')
+	send_numbers(address, 3)
+	finish(system, thread)
+	assert sorted(Collector.items) == [0, 1, 2]
+
+def test_unauthenticated_pickle_is_never_loaded(tmp_path):
+	address = str(tmp_path / 'collector.sock')
+	marker = str(tmp_path / 'exploited')
+	system = serve_collector(address, sources=1)
+	thread = run_in_thread(system)
+	payload = pickle.dumps(('item', Payload(marker)))
+	sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	sock.connect(address)
+	sock.sendall(struct.pack('!i', len(payload)) + payload)
+	sock.close()
+	send_numbers(address, 1)
+	finish(system, thread)
+	assert not os.path.exists(marker)
+	assert Collector.items == [0]
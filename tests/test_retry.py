@@ -0,0 +1,128 @@
+import threading
+
+import pytest
+
+from tasq.pipeline.system import System, WorkerGroup, ProcessWorkerGroup
+from tasq.pipeline.parallel import SimpleWorker
+from tasq.pipeline.service import ServiceManager
+from tasq.pipeline.journal import JournalPipe
+from tasq.pipeline.retry import RetryPolicy, DeadLetterStore, DeadLetterSource
+
+from conftest import Numbers, Collector
+
+
+class Flaky(SimpleWorker):
+	lock = threading.Lock()
+	attempts = {}
+	done = []
+
+	def process(self, data):
+		with self.lock:
+			self.attempts[data] = self.attempts.get(data, 0) + 1
+			if data % 2 and self.attempts[data] < 3:
+				raise ValueError('flaky %r' % (data,))
+			self.done.append(data)
+
+class Broken(SimpleWorker):
+	def process(self, data):
+		raise ValueError('broken %r' % (data,))
+
+class FailingPipe:
+	def __init__(self, limit):
+		self.items = []
+		self.limit = limit
+
+	def append(self, item, block=True):
+		if len(self.items) >= self.limit:
+			raise OSError('downstream failed')
+		self.items.append(item)
+
+def test_failed_items_are_retried():
+	Flaky.attempts = {}
+	Flaky.done = []
+	system = System()
+	flaky = system.new_worker_group(2, Flaky, retry=RetryPolicy(max_attempts=3, backoff=0.01))
+	system.new_source(1, Numbers, 6).send_to(flaky)
+	system.mainloop()
+	assert sorted(Flaky.done) == list(range(6))
+	assert Flaky.attempts[1] == 3
+
+def test_exhausted_items_go_to_dead_letter_with_stage(tmp_path):
+	path = str(tmp_path / 'broken.dead')
+	system = System()
+	broken = system.new_worker_group(1, Broken, retry=RetryPolicy(max_attempts=2, backoff=0.01, dead_letter=path))
+	system.new_source(1, Numbers, 3).send_to(broken)
+	system.mainloop()
+	entries = DeadLetterStore(path).entries()
+	assert sorted(entry['item'] for entry in entries) == [0, 1, 2]
+	assert all(entry['stage'] == 'Broken' and entry['attempts'] == 2 for entry in entries)
+
+def test_replay_filters_by_stage_and_keeps_other_entries(tmp_path):
+	path = str(tmp_path / 'fetch.dead')
+	store = DeadLetterStore(path)
+	for stage, item in (('A', 1), ('B', 2), ('A', 3), ('B', 4)):
+		store.put({'stage': stage, 'item': item})
+	system = System()
+	collector = system.new_worker_group(1, Collector)
+	system.new_source(1, DeadLetterSource, (path, 'A')).send_to(collector)
+	system.mainloop()
+	assert sorted(Collector.items) == [1, 3]
+	assert [entry['item'] for entry in store.entries()] == [2, 4]
+
+def test_entries_survive_a_failed_replay(tmp_path):
+	path = str(tmp_path / 'fetch.dead')
+	store = DeadLetterStore(path)
+	for item in range(3):
+		store.put({'stage': 'A', 'item': item})
+	source = DeadLetterSource(None, path)
+	source.send_to(FailingPipe(1))
+	with pytest.raises(OSError):
+		source.process(None)
+	assert [entry['item'] for entry in store.entries()] == [0, 1, 2]
+
+def test_journaled_item_is_acked_only_after_its_retry(tmp_path):
+	path = str(tmp_path / 'flaky')
+	Flaky.attempts = {}
+	Flaky.done = []
+	group = WorkerGroup(1, Flaky, journal=path, retry=RetryPolicy(max_attempts=3, backoff=60))
+	worker = group.worker_list[0]
+	group.pipe.append(1)
+	group.pipe.append(2)
+	worker.handle(group.pipe.popleft())
+	worker.handle(group.pipe.popleft())
+	assert Flaky.done == [2]
+	assert group.pipe.acked == 0
+	assert [entry.item for entry in JournalPipe(path).items] == [1, 2]
+
+	worker.retries = [(0,) + entry[1:] for entry in worker.retries]
+	worker.run_retries()
+	worker.retries = [(0,) + entry[1:] for entry in worker.retries]
+	worker.run_retries()
+	assert Flaky.done == [2, 1]
+	assert group.pipe.acked == 2
+
+def test_journaled_item_is_acked_after_dead_letter(tmp_path):
+	path = str(tmp_path / 'broken')
+	group = WorkerGroup(1, Broken, journal=path, retry=RetryPolicy(max_attempts=1, dead_letter=path + '.dead'))
+	worker = group.worker_list[0]
+	group.pipe.append(7)
+	worker.handle(group.pipe.popleft())
+	assert group.pipe.acked == 1
+	assert [entry['item'] for entry in DeadLetterStore(path + '.dead').entries()] == [7]
+
+def test_shared_memory_process_groups_are_not_retried():
+	group = ProcessWorkerGroup(1, Broken, shared_memory=True, retry=RetryPolicy(max_attempts=3, backoff=0.01))
+	worker = group.worker_list[0]
+	worker.schedule_retry(1, 1, [])
+	assert worker.retries == []
+
+@pytest.mark.parametrize('fetcher', ['SingleStockFetcher', 'CounterSingleStockFetcher'])
+def test_aborted_fetch_is_not_a_success(monkeypatch, fetcher):
+	worker_module = pytest.importorskip('tasq.stock.worker')
+	monkeypatch.setitem(ServiceManager.port_map, 'message', None)
+	monkeypatch.setitem(ServiceManager.port_map, 'db', None)
+	worker = getattr(worker_module, fetcher)(None, {'db': 'db', 'fetch_interval': 0})
+	worker.fetchIndex = lambda date: {}
+	worker.running = False
+	with pytest.raises(InterruptedError):
+		worker.process('2021-01-04')
@@ -0,0 +1,26 @@
+from tasq.pipeline.system import System
+
+from conftest import Numbers, Collector
+
+
+def keys_by_worker():
+	return [set(data % 3 for data in items) for items in Collector.workers.values()]
+
+def test_keyed_routing_keeps_keys_on_one_worker():
+	system = System()
+	collector = system.new_worker_group(3, Collector)
+	system.new_source(1, Numbers, 30).send_to(collector, key=lambda data: data % 3)
+	system.mainloop()
+	assert sorted(Collector.items) == list(range(30))
+	keys = keys_by_worker()
+	assert sum(len(worker_keys) for worker_keys in keys) == 3
+
+def test_pipe_of_partitioned_group_reaches_workers():
+	system = System()
+	collector = system.new_worker_group(3, Collector)
+	system.new_source(1, Numbers, 30).send_to(collector, key=lambda data: data % 3)
+	for i in range(30, 36):
+		collector.pipe.append(i)
+	assert len(collector.pipe) == 6
+	system.mainloop()
+	assert sorted(Collector.items) == list(range(36))
@@ -0,0 +1,76 @@
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from tasq.pipeline.system import System
+from tasq.pipeline.parallel import AsyncWorker
+from tasq.pipeline.service import ServiceWorker, ServiceManager
+
+from conftest import Numbers
+
+
+class Doubler(ServiceWorker):
+	def process(self, data):
+		if data == 'fail':
+			raise ValueError('service failed')
+		return data * 2
+
+	class Port(ServiceWorker.Port):
+		def double(self, data):
+			return self.request(data, no_wait=False)
+
+		def notify(self, data):
+			return self.request(data)
+
+class AsyncCaller(AsyncWorker):
+	items = []
+
+	async def process(self, data):
+		port = ServiceManager.get('service-async')
+		self.items.append(await port.aio.double(data))
+
+@pytest.fixture
+def port():
+	system = System()
+	service = system.new_service(Doubler, 'service-futures', {})
+	service.start()
+	yield ServiceManager.get('service-futures')
+	service.abort()
+	service.join()
+
+def test_futures_resolve_with_the_result(port):
+	futures = [port.futures.double(i) for i in range(20)]
+	assert all(isinstance(future, Future) for future in futures)
+	assert [future.result(5) for future in futures] == [i * 2 for i in range(20)]
+
+def test_futures_carry_service_errors(port):
+	future = port.futures.double('fail')
+	with pytest.raises(ValueError, match='service failed'):
+		future.result(5)
+
+def test_no_wait_requests_stay_fire_and_forget(port):
+	assert port.futures.notify(1) is None
+	assert port.double(2) == 4
+
+def test_concurrent_callers_get_their_own_replies(port):
+	results = {}
+
+	def call(index):
+		results[index] = port.double(index)
+
+	threads = [threading.Thread(target=call, args=(i,)) for i in range(16)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	assert results == {i: i * 2 for i in range(16)}
+
+def test_aio_requests_can_be_awaited_in_async_workers():
+	AsyncCaller.items = []
+	system = System()
+	system.new_service(Doubler, 'service-async', {})
+	caller = system.new_async_group(8, AsyncCaller)
+	system.new_source(1, Numbers, 20).send_to(caller)
+	system.mainloop()
+	assert sorted(AsyncCaller.items) == [i * 2 for i in range(20)]
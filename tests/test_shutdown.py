@@ -0,0 +1,36 @@
+import threading
+import time
+
+from tasq.pipeline.system import System, WorkerGroup
+from tasq.pipeline.parallel import SIGNAL_STOP
+
+from conftest import Numbers, Collector
+
+
+def test_concurrent_sources_stop_the_group_once():
+	group = WorkerGroup(2, Collector)
+	group.source_count = 64
+	barrier = threading.Barrier(64)
+
+	def finish():
+		barrier.wait()
+		group.set_source_empty()
+
+	threads = [threading.Thread(target=finish) for _ in range(64)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	assert group.source_count == 0
+	assert group.stopping
+	assert [group.pipe.popleft(0) for _ in range(len(group.pipe))] == [SIGNAL_STOP, SIGNAL_STOP]
+
+def test_mainloop_returns_when_many_sources_finish():
+	system = System()
+	collector = system.new_worker_group(2, Collector)
+	for _ in range(16):
+		system.new_source(1, Numbers, 10).send_to(collector)
+	started = time.monotonic()
+	system.mainloop()
+	assert time.monotonic() - started < 1
+	assert sorted(Collector.items) == sorted(list(range(10)) * 16)
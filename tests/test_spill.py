@@ -0,0 +1,34 @@
+from tasq.pipeline.system import System
+from tasq.pipeline.parallel import SIGNAL_STOP, SIGNAL_RETIRE
+from tasq.pipeline.spill import SpillPipe
+
+from conftest import Numbers, Collector
+
+
+def test_backlog_beyond_memory_items_goes_to_disk_in_order():
+	pipe = SpillPipe(4)
+	for item in range(100):
+		pipe.append(item)
+	assert len(pipe) == 100
+	assert len(pipe.items) == 4
+	assert pipe.spilled == 96
+	assert [pipe.popleft(0) for _ in range(100)] == list(range(100))
+	assert pipe.spilled == 0
+	assert pipe.spill_file.tell() == 0
+
+def test_signals_keep_their_identity_on_disk():
+	pipe = SpillPipe(1)
+	pipe.append('item')
+	pipe.append(SIGNAL_RETIRE)
+	pipe.append(SIGNAL_STOP)
+	assert pipe.spilled == 2
+	assert pipe.popleft(0) == 'item'
+	assert pipe.popleft(0) is SIGNAL_RETIRE
+	assert pipe.popleft(0) is SIGNAL_STOP
+
+def test_spilling_group_delivers_every_item_in_order():
+	system = System()
+	collector = system.new_worker_group(1, Collector, spill=8)
+	system.new_source(1, Numbers, 1000).send_to(collector)
+	system.mainloop()
+	assert Collector.items == list(range(1000))
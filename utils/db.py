@@ -17,13 +17,19 @@ class OrmBaseDatabase:
 		self.conn = None
 		self.session = None
 		self.table_dict = table_dict
+		self.deferred = False
 
-	def connect(self, db_path, app=None):
+	def connect(self, db_path, app=None, readonly=False, wal=False):
 		DB_CONNECT_STRING = 'sqlite:///' + db_path
+		if readonly:
+			DB_CONNECT_STRING = 'sqlite:///file:%s?mode=ro&uri=true' % (db_path,)
 		if app is None:
 			self.engine = create_engine(DB_CONNECT_STRING, echo=False)
 			self.conn = self.engine.connect()
-			self.base.metadata.create_all(bind=self.engine)
+			if wal:
+				self.conn.execute(text('PRAGMA journal_mode=WAL'))
+			if not readonly:
+				self.base.metadata.create_all(bind=self.engine)
 			self.session = sessionmaker(bind=self.engine)()
 		else:
 			app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
@@ -35,6 +41,10 @@ class OrmBaseDatabase:
 		self.session.close()
 		self.session = None
 
+	def commit(self):
+		if not self.deferred:
+			self.session.commit()
+
 	def execute(self, sql, params):
 		try:
 			self.session.execute(sql, params)
@@ -101,7 +111,7 @@ class OrmBaseDatabase:
 		try:
 			stmt = self.table_dict[table].insert(prefixes=['OR REPLACE']).values(**{field: bindparam(field) for field in fields})
 			cursor = self.session.execute(stmt, attr)
-			self.session.commit()
+			self.commit()
 			
 			if isinstance(id_field, list):
 				fields = id_field
@@ -117,14 +127,18 @@ class OrmBaseDatabase:
 
 			return self.session.execute(stmt, inserted_primary).fetchone()
 		except  SQLAlchemyError as e:
+			if self.deferred:
+				raise
 			print(e)
 
 	def delete(self, table, attr):
 		try:
 			stmt = self.append_where(self.table_dict[table].columns, self.table_dict[table].delete(), attr)
 			self.session.execute(stmt, attr)
-			self.session.commit()
+			self.commit()
 		except sqlite3.Error as e:
+			if self.deferred:
+				raise
 			print(e)
 
 